@@ -0,0 +1,172 @@
+"""
+Benchmarks of GA, DE and PSO evolution measuring fitness function evaluations per second, epoch latency and peak
+memory usage over a grid of population sizes, numbers of starting positions, hidden layer widths and numbers of
+evaluation processes.
+
+Every configuration runs in a fresh interpreter so that peak RSS is measured separately. Unless KHEPERA_LIB is
+already set (or --lib is given), the stand-in engine from benchmarks/khepera_stub.c is built and used.
+
+Examples:
+    python -m benchmarks.harness --save benchmarks/baselines/local.json
+    python -m benchmarks.harness --algs ga --pop-size 50,100 --num-proc 1,4 --compare benchmarks/baselines/local.json
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+from collections import OrderedDict
+from datetime import datetime
+from timeit import default_timer as timer
+
+import numpy as np
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_WORLD = os.path.join(BENCHMARKS_DIR, os.pardir, 'examples', 'worlds', 'circles_asym.wd')
+ALGORITHMS = ('ga', 'de', 'pso')
+GRID_KEYS = ('backend', 'alg', 'pop_size', 'num_positions', 'width', 'num_proc')
+
+
+def config_key(config):
+    return '{backend}/{alg}/pop={pop_size}/pos={num_positions}/width={width}/proc={num_proc}'.format(**config)
+
+
+def peak_rss():
+    """Return peak resident set size of this process plus the largest of its finished children in MiB."""
+    import resource
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            + resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) * scale / 2. ** 20
+
+
+def run_config(config):
+    """Run one evolution described by config and return its measurements."""
+    from kheppy.evocom.commons import NeuralNet
+    from kheppy.evocom.de import DiffEvolution
+    from kheppy.evocom.ga import GeneticAlgorithm
+    from kheppy.evocom.pso import PartSwarmOpt
+    from kheppy.utils.fitfunc import avoid_collision
+
+    algorithm = {'ga': GeneticAlgorithm, 'de': DiffEvolution, 'pso': PartSwarmOpt}[config['alg']]()
+    model = NeuralNet(8).add_layer(config['width'], 'relu').add_layer(2, 'tanh')
+    algorithm.main_params(pop_size=config['pop_size'], max_epochs=config['epochs'])
+    algorithm.eval_params(model, avoid_collision, num_cycles=config['num_cycles'],
+                          num_positions=config['num_positions'], position=config['position'],
+                          lockstep=config['lockstep'])
+    algorithm.sim_params(config['world'], robot_id=1, backend=config['backend'])
+
+    epoch_times = []
+    get_next_pop = algorithm._get_next_pop
+
+    def timed_next_pop(pop):
+        start = timer()
+        result = get_next_pop(pop)
+        epoch_times.append(timer() - start)
+        return result
+
+    algorithm._get_next_pop = timed_next_pop
+    start = timer()
+    algorithm.run(num_proc=config['num_proc'], seed=config['seed'])
+    total_time = timer() - start
+
+    ffe = algorithm.reporter.entries['ffe'][-1][-1]
+    return {'ffe': int(ffe),
+            'ffe_per_s': ffe / sum(epoch_times),
+            'epoch_mean_s': float(np.mean(epoch_times)),
+            'epoch_median_s': float(np.median(epoch_times)),
+            'epoch_p90_s': float(np.percentile(epoch_times, 90)),
+            'setup_s': total_time - sum(epoch_times),
+            'peak_rss_mib': peak_rss(),
+            'best_fitness': float(algorithm.best.fitness)}
+
+
+def run_isolated(config, env):
+    output = subprocess.check_output([sys.executable, '-m', 'benchmarks.harness', '--single', json.dumps(config)],
+                                     env=env, cwd=os.path.join(BENCHMARKS_DIR, os.pardir))
+    return json.loads(output.decode().strip().splitlines()[-1])
+
+
+def compare(results, baseline, tolerance):
+    """Print relative change of FFE/s and peak RSS against baseline and return keys of regressed configurations."""
+    regressions = []
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        speed = result['ffe_per_s'] / baseline[key]['ffe_per_s'] - 1
+        memory = result['peak_rss_mib'] / baseline[key]['peak_rss_mib'] - 1
+        regressed = speed < -tolerance or memory > tolerance
+        print('{:<52} FFE/s {:>+7.1%}  peak RSS {:>+7.1%}{}'.format(key, speed, memory,
+                                                                    '  REGRESSION' if regressed else ''))
+        if regressed:
+            regressions.append(key)
+    return regressions
+
+
+def parse_list(value, cast=int):
+    return [cast(v) for v in value.split(',')]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark kheppy evolutionary algorithms.')
+    parser.add_argument('--backends', type=lambda v: parse_list(v, str), default=['native'])
+    parser.add_argument('--algs', type=lambda v: parse_list(v, str), default=list(ALGORITHMS))
+    parser.add_argument('--pop-size', type=parse_list, default=[20, 50])
+    parser.add_argument('--num-positions', type=parse_list, default=[1, 3])
+    parser.add_argument('--width', type=parse_list, default=[10, 50])
+    parser.add_argument('--num-proc', type=parse_list, default=[1, 2])
+    parser.add_argument('--epochs', type=int, default=5)
+    parser.add_argument('--num-cycles', type=int, default=40)
+    parser.add_argument('--position', default='static')
+    parser.add_argument('--lockstep', action='store_true')
+    parser.add_argument('--world', default=DEFAULT_WORLD)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--lib', help='engine library, overrides KHEPERA_LIB')
+    parser.add_argument('--save', help='write results to JSON baseline file')
+    parser.add_argument('--compare', help='compare results with JSON baseline file')
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help='relative FFE/s drop or peak RSS growth reported as regression')
+    parser.add_argument('--single', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.single is not None:
+        print(json.dumps(run_config(json.loads(args.single))))
+        return 0
+
+    env = dict(os.environ)
+    if args.lib is not None:
+        env['KHEPERA_LIB'] = args.lib
+    elif 'KHEPERA_LIB' not in env:
+        from benchmarks.stub import build
+        env['KHEPERA_LIB'] = build()
+
+    common = {'epochs': args.epochs, 'num_cycles': args.num_cycles, 'position': args.position,
+              'lockstep': args.lockstep, 'world': os.path.abspath(args.world), 'seed': args.seed}
+    results = OrderedDict()
+    for values in itertools.product(args.backends, args.algs, args.pop_size, args.num_positions, args.width,
+                                    args.num_proc):
+        config = dict(common, **dict(zip(GRID_KEYS, values)))
+        result = run_isolated(config, env)
+        results[config_key(config)] = dict(result, config=config)
+        print('{:<52} {:>10.1f} FFE/s  epoch {:>7.3f}s (p90 {:>7.3f}s)  peak RSS {:>7.1f} MiB'
+              .format(config_key(config), result['ffe_per_s'], result['epoch_median_s'], result['epoch_p90_s'],
+                      result['peak_rss_mib']), flush=True)
+
+    if args.save is not None:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        meta = {'date': datetime.now().isoformat(timespec='seconds'), 'python': platform.python_version(),
+                'numpy': np.__version__, 'platform': platform.platform(), 'lib': env['KHEPERA_LIB']}
+        with open(args.save, 'w') as f:
+            json.dump({'meta': meta, 'results': results}, f, indent=2)
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+        if compare(results, baseline, args.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
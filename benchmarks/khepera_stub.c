@@ -0,0 +1,160 @@
+/*
+ * Stand-in for the Khepera simulation engine (https://github.com/Ewande/khepera) used by kheppy benchmarks.
+ *
+ * Exports the functions called by kheppy.core.Simulation and parses the same .wd world description
+ * (robots and circular obstacles). Physics are simplified: differential drive integrated in SUBSTEPS
+ * sub-steps per simulation step with collision checks against walls and obstacles, sensors cast RAYS rays
+ * over their view angle. Both can be set at compile time (-DSUBSTEPS=n, -DRAYS=n) to tune the cost of a step;
+ * fitness values are not comparable with the real engine. Build with -DNO_RESTORE to leave out the optional
+ * restoreSimulation export.
+ */
+#include <math.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+
+#ifndef SUBSTEPS
+#define SUBSTEPS 4
+#endif
+#ifndef RAYS
+#define RAYS 3
+#endif
+
+#define MAX_SENSORS 16
+#define MAX_OBJECTS 32
+#define DT 0.1
+
+typedef struct {
+    double range, view, angle;
+} Sensor;
+
+typedef struct {
+    int id;
+    double x, y, radius, axle, angle;
+    double left, right;
+    int sensor_count;
+    Sensor sensors[MAX_SENSORS];
+    struct Sim *sim;
+} Robot;
+
+typedef struct { double x, y, r; } Circle;
+
+typedef struct Sim {
+    double width, height;
+    int robot_count, circle_count;
+    Robot robots[MAX_OBJECTS];
+    Circle circles[MAX_OBJECTS];
+} Sim;
+
+static unsigned long long rng_state = 42;
+
+static double rnd(void) {
+    rng_state = rng_state * 6364136223846793005ULL + 1442695040888963407ULL;
+    return (double)(rng_state >> 11) / 9007199254740992.0;
+}
+
+float setSeed(int seed) { rng_state = (unsigned long long)seed * 2654435761ULL + 1; return 0; }
+
+void *createSimulation(const char *path, int unused) {
+    FILE *f = fopen(path, "r");
+    if (!f) return NULL;
+    Sim *s = calloc(1, sizeof(Sim));
+    int a, b, n;
+    if (fscanf(f, "%lf %lf %d %d %d", &s->width, &s->height, &a, &b, &n) != 5) { fclose(f); free(s); return NULL; }
+    for (int i = 0; i < n; i++) {
+        int type, id, movable; double weight;
+        if (fscanf(f, "%d %d %d %lf", &type, &id, &movable, &weight) != 4) break;
+        if (type == 2) {
+            Robot *r = &s->robots[s->robot_count++];
+            double p1, p2;
+            fscanf(f, "%lf %lf %lf %lf %lf %lf", &r->x, &r->y, &r->radius, &p1, &p2, &r->angle);
+            r->id = id; r->axle = 2 * r->radius;
+            fscanf(f, "%d", &r->sensor_count);
+            for (int j = 0; j < r->sensor_count; j++) {
+                int st; double extra;
+                fscanf(f, "%d %lf %lf %lf %lf", &st, &r->sensors[j].range, &r->sensors[j].view,
+                       &r->sensors[j].angle, &extra);
+            }
+        } else if (type == 1) {
+            Circle *c = &s->circles[s->circle_count++];
+            fscanf(f, "%lf %lf %lf", &c->x, &c->y, &c->r);
+        }
+    }
+    fclose(f);
+    return s;
+}
+
+void *cloneSimulation(Sim *s) { Sim *c = malloc(sizeof(Sim)); memcpy(c, s, sizeof(Sim)); return c; }
+void removeSimulation(Sim *s) { free(s); }
+
+void *getRobot(Sim *s, int id) {
+    for (int i = 0; i < s->robot_count; i++) if (s->robots[i].id == id) { s->robots[i].sim = s; return &s->robots[i]; }
+    return NULL;
+}
+
+void setRobotSpeed(Robot *r, double left, double right) { r->left = left; r->right = right; }
+
+static int collides(Sim *s, double x, double y, double radius) {
+    if (x - radius < 0 || y - radius < 0 || x + radius > s->width || y + radius > s->height) return 1;
+    for (int i = 0; i < s->circle_count; i++) {
+        double dx = x - s->circles[i].x, dy = y - s->circles[i].y, d = s->circles[i].r + radius;
+        if (dx * dx + dy * dy < d * d) return 1;
+    }
+    return 0;
+}
+
+void updateSimulation(Sim *s, int steps) {
+    const double dt = DT / SUBSTEPS;
+    for (int k = 0; k < steps * SUBSTEPS; k++) {
+        for (int i = 0; i < s->robot_count; i++) {
+            Robot *r = &s->robots[i];
+            double v = (r->left + r->right) / 2, w = (r->right - r->left) / r->axle;
+            double nx = r->x + v * cos(r->angle) * dt, ny = r->y + v * sin(r->angle) * dt;
+            r->angle = fmod(r->angle + w * dt, 2 * M_PI);
+            if (!collides(s, nx, ny, r->radius)) { r->x = nx; r->y = ny; }
+        }
+    }
+}
+
+static double ray(Sim *s, double x, double y, double a, double range) {
+    double dx = cos(a), dy = sin(a), best = range, t;
+    if (dx > 0) { t = (s->width - x) / dx; if (t < best) best = t; }
+    if (dx < 0) { t = -x / dx; if (t < best) best = t; }
+    if (dy > 0) { t = (s->height - y) / dy; if (t < best) best = t; }
+    if (dy < 0) { t = -y / dy; if (t < best) best = t; }
+    for (int i = 0; i < s->circle_count; i++) {
+        double ox = x - s->circles[i].x, oy = y - s->circles[i].y;
+        double bq = ox * dx + oy * dy, c = ox * ox + oy * oy - s->circles[i].r * s->circles[i].r;
+        double disc = bq * bq - c;
+        if (disc >= 0) { t = -bq - sqrt(disc); if (t >= 0 && t < best) best = t; }
+    }
+    return best;
+}
+
+int getSensorCount(Robot *r) { return r->sensor_count; }
+
+float getSensorState(Robot *r, int i) {
+    Sensor *sn = &r->sensors[i];
+    double value = 0;
+    for (int k = 0; k < RAYS; k++) {
+        double a = r->angle + sn->angle + sn->view * ((double)k / (RAYS - 1) - 0.5);
+        double sx = r->x + r->radius * cos(a), sy = r->y + r->radius * sin(a);
+        double d = ray(r->sim, sx, sy, a, sn->range), v = 1 - d / sn->range;
+        if (v > value) value = v;
+    }
+    return (float)value;
+}
+
+float getRobotXCoord(Robot *r) { return (float)r->x; }
+float getRobotYCoord(Robot *r) { return (float)r->y; }
+
+void teleportRobotRandom(Sim *s, Robot *r) {
+    do {
+        r->x = rnd() * s->width; r->y = rnd() * s->height;
+    } while (collides(s, r->x, r->y, r->radius));
+    r->angle = rnd() * 2 * M_PI;
+}
+
+#ifndef NO_RESTORE
+void restoreSimulation(Sim *dst, Sim *src) { memcpy(dst, src, sizeof(Sim)); }
+#endif
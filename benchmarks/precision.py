@@ -0,0 +1,97 @@
+"""
+Parity check of float32 precision mode (NeuralNet(..., dtype=np.float32)) against float64.
+
+The same random genomes are evaluated with float64 and float32 networks on every evaluation path (serial,
+lockstep, numpy backend); the check fails when fitness of any genome differs by more than the tolerance.
+Inference time of batched forward passes and size of pickled genome matrices are reported for both precisions.
+
+Examples:
+    python -m benchmarks.precision
+    python -m benchmarks.precision --num-genomes 200 --width 64 --tolerance 1e-4
+"""
+import argparse
+import os
+import pickle
+import sys
+from timeit import default_timer as timer
+
+import numpy as np
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_WORLD = os.path.join(BENCHMARKS_DIR, os.pardir, 'examples', 'worlds', 'circles_asym.wd')
+PATHS = (('serial', 'native', False), ('lockstep', 'native', True), ('numpy', 'numpy', False))
+
+
+def evaluate(genomes, dtype, backend, lockstep, args):
+    from kheppy.evocom.commons import NeuralNet
+    from kheppy.evocom.commons.evaluation import Evaluator
+    from kheppy.evocom.ga import GeneticAlgorithm
+    from kheppy.utils.fitfunc import avoid_collision
+
+    model = NeuralNet(8, dtype=dtype).add_layer(args.width, 'relu').add_layer(2, 'tanh')
+    algorithm = GeneticAlgorithm().eval_params(model, avoid_collision, num_cycles=args.num_cycles,
+                                               num_positions=args.num_positions, lockstep=lockstep)
+    algorithm.sim_params(args.world, robot_id=1, backend=backend)
+    with Evaluator(algorithm.params, len(genomes)) as evaluator:
+        evaluator.update_positions('shuffle_defaults', {'seed': args.seed})
+        fitness, _ = evaluator.evaluate(genomes.astype(dtype))
+    return fitness
+
+
+def inference_time(genomes, dtype, args, repeat=20):
+    from kheppy.evocom.commons import NeuralNet
+
+    model = NeuralNet(8, dtype=dtype).add_layer(args.width, 'relu').add_layer(2, 'tanh')
+    weights, biases = model.unpack(genomes.astype(dtype))
+    inputs = np.random.RandomState(args.seed).uniform(0, 1, (len(genomes), args.num_positions, 8)).astype(dtype)
+    start = timer()
+    for _ in range(repeat):
+        model.predict_batch(inputs, weights, biases)
+    return (timer() - start) / repeat
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--num-genomes', type=int, default=100)
+    parser.add_argument('--num-positions', type=int, default=3)
+    parser.add_argument('--num-cycles', type=int, default=80)
+    parser.add_argument('--width', type=int, default=30, help='hidden layer width')
+    parser.add_argument('--world', default=DEFAULT_WORLD)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--tolerance', type=float, default=1e-3, help='maximum absolute fitness difference')
+    parser.add_argument('--lib', help='engine library, overrides KHEPERA_LIB')
+    args = parser.parse_args(argv)
+
+    if args.lib is not None:
+        os.environ['KHEPERA_LIB'] = args.lib
+    elif 'KHEPERA_LIB' not in os.environ:
+        from benchmarks.stub import build
+        os.environ['KHEPERA_LIB'] = build()
+
+    from kheppy.evocom.commons import NeuralNet
+    genome_len = NeuralNet(8).add_layer(args.width, 'relu').add_layer(2, 'tanh').genome_len
+    genomes = np.random.RandomState(args.seed).uniform(-1, 1, (args.num_genomes, genome_len))
+
+    failed = False
+    for name, backend, lockstep in PATHS:
+        reference = evaluate(genomes, np.float64, backend, lockstep, args)
+        single = evaluate(genomes, np.float32, backend, lockstep, args)
+        diff = np.abs(reference - single)
+        same_best = np.argmax(reference) == np.argmax(single)
+        print('{:<9} max abs diff: {:.2e} | mean abs diff: {:.2e} | same best genome: {}'
+              .format(name, diff.max(), diff.mean(), same_best))
+        failed |= diff.max() > args.tolerance
+
+    for dtype in (np.float64, np.float32):
+        print('{:<9} genome matrix pickle: {:>8.1f} KiB | batched inference: {:.3f} ms'
+              .format(np.dtype(dtype).name, len(pickle.dumps(genomes.astype(dtype))) / 1024.,
+                      1000 * inference_time(genomes, dtype, args)))
+
+    if failed:
+        print('Fitness difference exceeds tolerance {}.'.format(args.tolerance))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,71 @@
+"""
+Parity check of sharded testing (BaseAlgorithm.test(..., num_proc=N)) against a single process.
+
+A short evolution is run first, so that the tested network has already been used (and compiled) in the parent
+process before it is sent to shard processes. The check fails when any starting position gets a different fitness
+than in the serial test, for any of the given start methods.
+
+Examples:
+    python -m benchmarks.sharding
+    python -m benchmarks.sharding --num-proc 4 --num-points 40 --start-methods fork spawn
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_WORLD = os.path.join(BENCHMARKS_DIR, os.pardir, 'examples', 'worlds', 'circles_asym.wd')
+
+
+def evolve(args):
+    from kheppy.evocom.commons import NeuralNet
+    from kheppy.evocom.ga import GeneticAlgorithm
+    from kheppy.utils.fitfunc import avoid_collision
+
+    model = NeuralNet(8).add_layer(args.width, 'relu').add_layer(2, 'tanh')
+    algorithm = GeneticAlgorithm().eval_params(model, avoid_collision, num_cycles=args.num_cycles, num_positions=2)
+    algorithm.sim_params(args.world, robot_id=1).main_params(pop_size=10, max_epochs=2)
+    algorithm.run(seed=args.seed)
+    return algorithm
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--num-proc', type=int, default=3)
+    parser.add_argument('--num-points', type=int, default=12)
+    parser.add_argument('--num-cycles', type=int, default=40)
+    parser.add_argument('--width', type=int, default=30, help='hidden layer width')
+    parser.add_argument('--world', default=DEFAULT_WORLD)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--start-methods', nargs='+', default=multiprocessing.get_all_start_methods(),
+                        help='multiprocessing start methods of shard processes')
+    parser.add_argument('--lib', help='engine library, overrides KHEPERA_LIB')
+    args = parser.parse_args(argv)
+
+    if args.lib is not None:
+        os.environ['KHEPERA_LIB'] = args.lib
+    elif 'KHEPERA_LIB' not in os.environ:
+        from benchmarks.stub import build
+        os.environ['KHEPERA_LIB'] = build()
+
+    algorithm = evolve(args)
+    reference = algorithm.test(num_points=args.num_points, num_cycles=args.num_cycles)
+
+    failed = False
+    for method in args.start_methods:
+        multiprocessing.set_start_method(method, force=True)
+        sharded = algorithm.test(num_points=args.num_points, num_cycles=args.num_cycles, num_proc=args.num_proc)
+        mismatched = sum(a != b for a, b in zip(reference, sharded))
+        print('{:<11} {} processes | mismatched points: {}/{}'.format(method, args.num_proc, mismatched,
+                                                                     args.num_points))
+        failed |= mismatched > 0 or len(sharded) != len(reference)
+
+    if failed:
+        print('Sharded test differs from the serial one.')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
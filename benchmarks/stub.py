@@ -0,0 +1,33 @@
+import os
+import subprocess
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def build(output=None, cc=None, substeps=4, rays=3, restore=True):
+    """Compile stand-in engine library and return path to it, which can be used as KHEPERA_LIB.
+
+    :param output: path of the shared library, by default 'build' directory in benchmarks
+    :param cc: C compiler, by default taken from CC environment variable or 'cc'
+    :param substeps: number of physics sub-steps per simulation step
+    :param rays: number of rays cast by every sensor
+    :param restore: export optional restoreSimulation function
+    """
+    if output is None:
+        output = os.path.join(BENCHMARKS_DIR, 'build', 'khepera_stub_s{}_r{}{}.so'
+                              .format(substeps, rays, '' if restore else '_norestore'))
+    source = os.path.join(BENCHMARKS_DIR, 'khepera_stub.c')
+    if os.path.exists(output) and os.path.getmtime(output) >= os.path.getmtime(source):
+        return output
+
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    command = [cc or os.environ.get('CC', 'cc'), '-O2', '-shared', '-fPIC', '-o', output, source, '-lm',
+               '-DSUBSTEPS={}'.format(substeps), '-DRAYS={}'.format(rays)]
+    if not restore:
+        command.append('-DNO_RESTORE')
+    subprocess.check_call(command)
+    return output
+
+
+if __name__ == '__main__':
+    print(build())
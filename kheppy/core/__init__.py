@@ -1 +1,5 @@
 from .simulation import Simulation, SimList
+from .numpy_backend import NumpySimulation, NumpySimList
+
+# simulation backends selectable in BaseAlgorithm.sim_params, name: (simulation class, simulation list class)
+BACKENDS = {'native': (Simulation, SimList), 'numpy': (NumpySimulation, NumpySimList)}
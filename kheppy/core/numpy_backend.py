@@ -0,0 +1,316 @@
+import numpy as np
+
+
+class World:
+    """
+    Static description of a world read from .wd file: arena size, robots and circular obstacles.
+
+    Robot line: 2 id movable weight x y radius param param angle, followed by number of sensors and one line
+    'type range view_angle angle param' per sensor. Obstacle line: 1 id movable weight x y radius.
+    """
+
+    def __init__(self, path):
+        with open(path) as f:
+            values = f.read().split()
+        self.width, self.height = float(values[0]), float(values[1])
+        num_objects = int(values[4])
+        pos = 5
+
+        self.robot_ids, robots, self.sensors = [], [], []
+        circles = []
+        for _ in range(num_objects):
+            obj_type, obj_id = int(values[pos]), int(values[pos + 1])
+            pos += 4
+            if obj_type == 2:
+                x, y, radius, _, _, angle = map(float, values[pos:pos + 6])
+                num_sensors = int(values[pos + 6])
+                pos += 7
+                sensors = np.array(values[pos:pos + 5 * num_sensors], dtype=float).reshape(num_sensors, 5)
+                pos += 5 * num_sensors
+                self.robot_ids.append(obj_id)
+                robots.append((x, y, radius, angle))
+                self.sensors.append(sensors[:, 1:4])
+            elif obj_type == 1:
+                circles.append(tuple(map(float, values[pos:pos + 3])))
+                pos += 3
+            else:
+                raise ValueError('Unsupported object type {} in {}.'.format(obj_type, path))
+
+        robots = np.array(robots, dtype=float).reshape(-1, 4)
+        self.robot_x, self.robot_y, self.robot_radius, self.robot_angle = robots.T
+        self.circles = np.array(circles, dtype=float).reshape(-1, 3)
+
+    def robot_index(self, robot_id):
+        return self.robot_ids.index(robot_id)
+
+
+class WorldBatch:
+    """
+    Many independent copies of one world, simulated together as arrays.
+
+    State of robot r in copy i is kept at [i, r] of arrays x, y, angle, left and right. Robots move with
+    differential drive, a move that would hit a wall or an obstacle is cancelled. Each proximity sensor casts
+    'rays' rays spread over its view angle and reports 1 - distance / range of the closest hit (0 when nothing is
+    in range). Robots are not detected by sensors and do not collide with each other.
+
+    Rows are selected with 'rows' argument (slice or index array, all rows by default).
+    """
+
+    time_step = 0.1
+
+    def __init__(self, world, size, substeps=4, rays=3):
+        self.world = world
+        self.size = size
+        self.substeps = substeps
+        shape = (size, len(world.robot_ids))
+        self.x = np.broadcast_to(world.robot_x, shape).copy()
+        self.y = np.broadcast_to(world.robot_y, shape).copy()
+        self.angle = np.broadcast_to(world.robot_angle, shape).copy()
+        self.left = np.zeros(shape)
+        self.right = np.zeros(shape)
+        self.ray_offsets = np.linspace(-0.5, 0.5, rays) if rays > 1 else np.zeros(1)
+
+    def state_arrays(self):
+        return self.x, self.y, self.angle, self.left, self.right
+
+    def copy_rows(self, source, source_rows=slice(None), rows=slice(None)):
+        """Copy state of source batch rows into rows of this batch, broadcasting if needed."""
+        for target, array in zip(self.state_arrays(), source.state_arrays()):
+            target[rows] = array[source_rows]
+
+    def tile(self, source):
+        """Make consecutive blocks of len(source) rows copies of source, remaining rows are left unchanged."""
+        count = self.size - self.size % source.size
+        for target, array in zip(self.state_arrays(), source.state_arrays()):
+            target[:count].reshape((-1,) + array.shape)[:] = array
+
+    def collides(self, x, y, radius):
+        world = self.world
+        hit = (x < radius) | (y < radius) | (x + radius > world.width) | (y + radius > world.height)
+        for cx, cy, cr in world.circles:
+            hit |= (x - cx) ** 2 + (y - cy) ** 2 < (cr + radius) ** 2
+        return hit
+
+    def set_speed(self, robot, left, right, rows=slice(None)):
+        self.left[rows, robot] = left
+        self.right[rows, robot] = right
+
+    def simulate(self, steps, rows=slice(None)):
+        x, y, angle = self.x[rows], self.y[rows], self.angle[rows]
+        left, right = self.left[rows], self.right[rows]
+        radius = self.world.robot_radius
+        dt = self.time_step / self.substeps
+        velocity = (left + right) / 2 * dt
+        rotation = (right - left) / (2 * radius) * dt
+        for _ in range(steps * self.substeps):
+            new_x = x + velocity * np.cos(angle)
+            new_y = y + velocity * np.sin(angle)
+            angle = np.fmod(angle + rotation, 2 * np.pi)
+            free = ~self.collides(new_x, new_y, radius)
+            x = np.where(free, new_x, x)
+            y = np.where(free, new_y, y)
+        self.x[rows], self.y[rows], self.angle[rows] = x, y, angle
+
+    def get_sensor_states(self, robot, rows=slice(None), out=None):
+        """Return array of shape (num_rows, num_sensors) with sensor states of given robot."""
+        world = self.world
+        sensors, radius = world.sensors[robot], world.robot_radius[robot]
+        sensor_range = sensors[:, 0, None]
+        # ray angles of shape (num_rows, num_sensors, num_rays)
+        angles = (self.angle[rows, robot, None, None] + sensors[:, 2, None]
+                  + sensors[:, 1, None] * self.ray_offsets)
+        dx, dy = np.cos(angles), np.sin(angles)
+        x = self.x[rows, robot, None, None] + radius * dx
+        y = self.y[rows, robot, None, None] + radius * dy
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            distance = np.minimum(np.where(dx > 0, (world.width - x) / dx, np.inf),
+                                  np.where(dx < 0, -x / dx, np.inf))
+            distance = np.minimum(distance, np.where(dy > 0, (world.height - y) / dy, np.inf))
+            distance = np.minimum(distance, np.where(dy < 0, -y / dy, np.inf))
+        for cx, cy, cr in world.circles:
+            ox, oy = x - cx, y - cy
+            b = ox * dx + oy * dy
+            disc = b * b - (ox * ox + oy * oy - cr * cr)
+            t = -b - np.sqrt(np.maximum(disc, 0))
+            distance = np.where((disc >= 0) & (t >= 0) & (t < distance), t, distance)
+        distance = np.minimum(distance, sensor_range)
+
+        values = np.max(1 - distance / sensor_range, axis=2)
+        if out is None:
+            return values.astype(np.float32)
+        out[...] = values.astype(np.float32)
+        return out
+
+    def teleport_random(self, robot, rng, rows=slice(None)):
+        """Move robot to random collision-free positions with random headings."""
+        indices = np.arange(self.size)[rows]
+        world, radius = self.world, self.world.robot_radius[robot]
+        pending = indices
+        while len(pending):
+            x = rng.uniform(0, world.width, len(pending))
+            y = rng.uniform(0, world.height, len(pending))
+            free = ~self.collides(x, y, radius)
+            self.x[pending[free], robot], self.y[pending[free], robot] = x[free], y[free]
+            pending = pending[~free]
+        self.angle[indices, robot] = rng.uniform(0, 2 * np.pi, len(indices))
+
+
+class NumpySimulation:
+    """
+    Simulation backed by one row of a WorldBatch, with the interface of kheppy.core.Simulation.
+
+    Physics follow the simplified model of WorldBatch, so fitness values differ from the ones of the native engine.
+    Simulations created with wd_path own a single-row batch, simulations returned by NumpySimList are views
+    of rows of a shared batch.
+    """
+
+    _rng = np.random.RandomState()
+
+    def __init__(self, wd_path=None, batch=None, row=0):
+        if wd_path is not None:
+            batch = WorldBatch(World(wd_path), 1)
+        self.batch = batch
+        self.row = row
+        self.rows = slice(row, row + 1)
+        self.initial = None
+        if wd_path is not None:
+            self.initial = WorldBatch(batch.world, 1)
+            self.initial.copy_rows(batch)
+        self.robot = None
+        self.robot_id = None
+        self.sensor_count = 0
+
+    @staticmethod
+    def can_restore_in_place():
+        return True
+
+    def copy(self):
+        sim = NumpySimulation(batch=WorldBatch(self.batch.world, 1))
+        sim.batch.copy_rows(self.batch, self.row)
+        sim.initial = self.initial
+        sim.set_controlled_robot(self.robot_id)
+        return sim
+
+    def reset(self):
+        self.batch.copy_rows(self.initial, 0, self.row)
+
+    def restore_from(self, other):
+        self.batch.copy_rows(other.batch, other.row, self.row)
+
+    def set_controlled_robot(self, robot_id):
+        if robot_id is None:
+            return
+        self.robot = self.batch.world.robot_index(robot_id)
+        self.robot_id = robot_id
+        self.sensor_count = len(self.batch.world.sensors[self.robot])
+
+    def set_robot_speed(self, left_motor_speed, right_motor_speed):
+        self.batch.set_speed(self.robot, left_motor_speed, right_motor_speed, self.rows)
+
+    def simulate(self, steps):
+        self.batch.simulate(steps, self.rows)
+
+    def get_sensor_states(self):
+        return self.batch.get_sensor_states(self.robot, self.rows)[0].tolist()
+
+    def read_sensors(self, out, position_out=None):
+        self.batch.get_sensor_states(self.robot, self.rows, out[None])
+        if position_out is not None:
+            position_out[:] = self.get_robot_position()
+        return out
+
+    @staticmethod
+    def read_sensors_many(sims, out, positions_out=None):
+        for j, sim in enumerate(sims):
+            sim.read_sensors(out[j], positions_out[j] if positions_out is not None else None)
+        return out
+
+    def get_robot_position(self):
+        return (float(np.float32(self.batch.x[self.row, self.robot])),
+                float(np.float32(self.batch.y[self.row, self.robot])))
+
+    @staticmethod
+    def set_seed(seed):
+        NumpySimulation._rng.seed(seed)
+
+    def move_robot_random(self):
+        self.batch.teleport_random(self.robot, NumpySimulation._rng, self.rows)
+
+    def close(self):
+        self.batch = None
+        self.initial = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class NumpySimList:
+    """
+    Counterpart of kheppy.core.SimList keeping all 'num_sim' * 'num_per_ctrl' worlds in one WorldBatch.
+
+    Row ctrl * num_per_ctrl + i of 'batch' holds world at position i of controller ctrl. Whole blocks of rows
+    can be stepped and read with batch methods, indexing returns lists of NumpySimulation views.
+    """
+
+    def __init__(self, path, num_sim, num_per_ctrl, robot_id):
+        world = World(path)
+        self.num_per_ctrl = num_per_ctrl
+        self.robot = world.robot_index(robot_id)
+        self.batch = WorldBatch(world, num_sim * num_per_ctrl)
+        self.defaults = WorldBatch(world, num_per_ctrl)
+        self.default_sims = [NumpySimulation(batch=self.defaults, row=i) for i in range(num_per_ctrl)]
+        self.list = [[NumpySimulation(batch=self.batch, row=ctrl * num_per_ctrl + i) for i in range(num_per_ctrl)]
+                     for ctrl in range(num_sim)]
+        for sim in self.default_sims + [sim for ctrl_sims in self.list for sim in ctrl_sims]:
+            sim.set_controlled_robot(robot_id)
+        self.reset_to_defaults()
+
+    def reset_to_defaults(self):
+        self.batch.tile(self.defaults)
+
+    def shuffle_defaults(self, seed=None):
+        if seed is not None:
+            NumpySimulation.set_seed(seed)
+        for sim in self.default_sims:
+            sim.move_robot_random()
+
+    def move_forward_defaults(self, step_size=1, max_noise=0, seed=None, noise=None):
+        """See SimList.move_forward_defaults."""
+        if seed is not None:
+            np.random.seed(seed)
+        if noise is None:
+            noise = [np.random.uniform(-max_noise, max_noise, size=2) for _ in self.default_sims]
+
+        noise = np.asarray(noise, dtype=float)
+        self.defaults.set_speed(self.robot, 1 + noise[:, 0], 1 + noise[:, 1])
+        self.defaults.simulate(step_size)
+
+    def rows(self, num_ctrl):
+        """Return slice of batch rows holding worlds of the first num_ctrl controllers."""
+        return slice(0, num_ctrl * self.num_per_ctrl)
+
+    def allocated(self):
+        return len(self.list)
+
+    def close(self):
+        self.batch = None
+        self.defaults = None
+
+    def __getitem__(self, item):
+        return self.list[item]
+
+    def __iter__(self):
+        return iter(self.list)
+
+    def __len__(self):
+        return len(self.list)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -1,8 +1,9 @@
 import warnings
-from ctypes import cdll, c_int, POINTER, c_float, create_string_buffer, c_double
+from itertools import count
+from ctypes import cdll, c_int, POINTER, c_float, create_string_buffer, c_double, c_char_p, c_bool
 import numpy as np
 
-from kheppy.core.constants import KHEPERA_LIB
+from kheppy.core.constants import KHEPERA_LIB, KHEPERA_LIB_MISSING
 
 
 class Simulation:
@@ -21,74 +22,218 @@ class Simulation:
             ...
 
     """
-    _dll = cdll.LoadLibrary(KHEPERA_LIB)
-    _dll.createSimulation.restype = POINTER(c_int)
-    _dll.getRobot.restype = POINTER(c_int)
-    _dll.getSensorState.restype = c_float
-    _dll.getSensorCount.restype = c_int
-    _dll.cloneSimulation.restype = POINTER(c_int)
-    _dll.getRobotXCoord.restype = c_float
-    _dll.getRobotYCoord.restype = c_float
-    _dll.setSeed.restype = c_float
+    # engine library is loaded on first use, see load_library
+    _dll = None
+    _restore_simulation = None
+    _set_robot_speed = None
+    _update_simulation = None
+    _get_sensor_state = None
+    _get_robot_x = None
+    _get_robot_y = None
+
+    # per-process counters of native world allocations ('created', 'cloned', 'removed'),
+    # in-place restores ('restored') and resets skipped because the world was unchanged ('skipped')
+    stats = {'created': 0, 'cloned': 0, 'removed': 0, 'restored': 0, 'skipped': 0}
+    _states = count()
 
     def __init__(self, wd_path=None):
+        self.sim = None
+        self.initial_state = None
         if wd_path is not None:
+            Simulation.load_library()
             self.sim = Simulation._dll.createSimulation(create_string_buffer(wd_path.encode()), False)
-            self.initial_state = Simulation._dll.cloneSimulation(self.sim)
+            Simulation.stats['created'] += 1
+            self.initial_state = Simulation._clone(self.sim)
         self.robot = None
         self.robot_id = None
+        self.sensor_count = 0
         self.sensor_states = None
         self.is_copy = wd_path is None
+        # equal tokens mean equal world states, every state-changing call draws a new token
+        self.state = next(Simulation._states)
+        self.initial_token = self.state
+
+    @staticmethod
+    def load_library():
+        """Load simulation engine pointed to by KHEPERA_LIB environment variable, if not loaded yet."""
+        if Simulation._dll is not None:
+            return
+        if KHEPERA_LIB is None:
+            raise Exception(KHEPERA_LIB_MISSING)
+        dll = cdll.LoadLibrary(KHEPERA_LIB)
+        dll.createSimulation.restype = POINTER(c_int)
+        dll.createSimulation.argtypes = [c_char_p, c_bool]
+        dll.cloneSimulation.restype = POINTER(c_int)
+        dll.cloneSimulation.argtypes = [POINTER(c_int)]
+        dll.removeSimulation.restype = None
+        dll.removeSimulation.argtypes = [POINTER(c_int)]
+        dll.updateSimulation.restype = None
+        dll.updateSimulation.argtypes = [POINTER(c_int), c_int]
+        dll.getRobot.restype = POINTER(c_int)
+        dll.getRobot.argtypes = [POINTER(c_int), c_int]
+        dll.setRobotSpeed.restype = None
+        dll.setRobotSpeed.argtypes = [POINTER(c_int), c_double, c_double]
+        dll.getSensorState.restype = c_float
+        dll.getSensorState.argtypes = [POINTER(c_int), c_int]
+        dll.getSensorCount.restype = c_int
+        dll.getSensorCount.argtypes = [POINTER(c_int)]
+        dll.getRobotXCoord.restype = c_float
+        dll.getRobotXCoord.argtypes = [POINTER(c_int)]
+        dll.getRobotYCoord.restype = c_float
+        dll.getRobotYCoord.argtypes = [POINTER(c_int)]
+        dll.setSeed.restype = c_float
+        dll.setSeed.argtypes = [c_int]
+        dll.teleportRobotRandom.restype = None
+        dll.teleportRobotRandom.argtypes = [POINTER(c_int), POINTER(c_int)]
+
+        # optional engine export restoreSimulation(target, source), copies world state into an existing handle
+        restore_simulation = getattr(dll, 'restoreSimulation', None)
+        if restore_simulation is not None:
+            restore_simulation.restype = None
+            restore_simulation.argtypes = [POINTER(c_int), POINTER(c_int)]
+        Simulation._restore_simulation = restore_simulation
+
+        # cached function pointers used in per-cycle calls
+        Simulation._set_robot_speed = dll.setRobotSpeed
+        Simulation._update_simulation = dll.updateSimulation
+        Simulation._get_sensor_state = dll.getSensorState
+        Simulation._get_robot_x = dll.getRobotXCoord
+        Simulation._get_robot_y = dll.getRobotYCoord
+        Simulation._dll = dll
 
     @staticmethod
     def _print_warning():
         warnings.warn('No robot to control. Use Simulation.set_controlled_robot first.')
 
+    @staticmethod
+    def _clone(handle):
+        Simulation.stats['cloned'] += 1
+        return Simulation._dll.cloneSimulation(handle)
+
+    @staticmethod
+    def _remove(handle):
+        Simulation.stats['removed'] += 1
+        Simulation._dll.removeSimulation(handle)
+
+    @staticmethod
+    def can_restore_in_place():
+        return Simulation._restore_simulation is not None
+
     def copy(self):
         sim = Simulation()
-        sim.sim = Simulation._dll.cloneSimulation(self.sim)
+        sim.sim = Simulation._clone(self.sim)
         sim.initial_state = self.initial_state
+        sim.initial_token = self.initial_token
         sim.set_controlled_robot(self.robot_id)
         sim.sensor_states = self.sensor_states
+        sim.state = self.state
         return sim
 
-    def reset(self):
-        Simulation._dll.removeSimulation(self.sim)
-        self.sim = Simulation._dll.cloneSimulation(self.initial_state)
+    def _restore(self, handle):
+        if Simulation.can_restore_in_place():
+            Simulation._restore_simulation(self.sim, handle)
+            Simulation.stats['restored'] += 1
+        else:
+            Simulation._remove(self.sim)
+            self.sim = Simulation._clone(handle)
         self.set_controlled_robot(self.robot_id)
+
+    def reset(self):
+        if self.state == self.initial_token:
+            Simulation.stats['skipped'] += 1
+            return
+        self._restore(self.initial_state)
+        self.state = self.initial_token
         self.sensor_states = None
 
+    def restore_from(self, other):
+        """Make this simulation a copy of other simulation of the same world, reusing the native handle if possible.
+
+        Nothing is done if this simulation has not changed since it was last copied or restored from other.
+        """
+        if self.state == other.state:
+            Simulation.stats['skipped'] += 1
+            return
+        self._restore(other.sim)
+        self.state = other.state
+        self.sensor_states = other.sensor_states
+
     def set_controlled_robot(self, robot_id):
         # TODO: handling incorrect robot id
+        if robot_id is None:
+            return
         self.robot = Simulation._dll.getRobot(self.sim, robot_id)
         self.robot_id = robot_id
+        self.sensor_count = Simulation._dll.getSensorCount(self.robot)
 
     def set_robot_speed(self, left_motor_speed, right_motor_speed):
         if self.robot is None:
             Simulation._print_warning()
         else:
-            Simulation._dll.setRobotSpeed(self.robot, c_double(left_motor_speed), c_double(right_motor_speed))
+            Simulation._set_robot_speed(self.robot, left_motor_speed, right_motor_speed)
+            self.state = next(Simulation._states)
 
     def simulate(self, steps):
-        Simulation._dll.updateSimulation(self.sim, steps)
+        Simulation._update_simulation(self.sim, steps)
         self.sensor_states = None
+        self.state = next(Simulation._states)
 
     def get_sensor_states(self):
         if self.robot is None:
             Simulation._print_warning()
         elif self.sensor_states is None:
-            count = Simulation._dll.getSensorCount(self.robot)
-            self.sensor_states = [Simulation._dll.getSensorState(self.robot, i) for i in range(count)]
+            get_state, robot = Simulation._get_sensor_state, self.robot
+            self.sensor_states = [get_state(robot, i) for i in range(self.sensor_count)]
         return self.sensor_states
 
+    def read_sensors(self, out, position_out=None):
+        """Write current sensor states into preallocated array, without building intermediate Python objects.
+
+        :param out: float array (float32 recommended) of length sensor_count
+        :param position_out: optional float array of length 2, receives robot (x, y) coordinates
+
+        :return: out
+        """
+        if self.robot is None:
+            Simulation._print_warning()
+            return out
+        get_state, robot = Simulation._get_sensor_state, self.robot
+        for i in range(self.sensor_count):
+            out[i] = get_state(robot, i)
+        if position_out is not None:
+            position_out[0] = Simulation._get_robot_x(robot)
+            position_out[1] = Simulation._get_robot_y(robot)
+        return out
+
+    @staticmethod
+    def read_sensors_many(sims, out, positions_out=None):
+        """Fill (len(sims), sensor_count) array with sensor states of many simulations.
+
+        :param sims: sequence of Simulation objects controlling robots with the same number of sensors
+        :param out: float array of shape (len(sims), sensor_count)
+        :param positions_out: optional float array of shape (len(sims), 2), receives robot (x, y) coordinates
+
+        :return: out
+        """
+        get_state, get_x, get_y = Simulation._get_sensor_state, Simulation._get_robot_x, Simulation._get_robot_y
+        for j, sim in enumerate(sims):
+            robot, row = sim.robot, out[j]
+            for i in range(sim.sensor_count):
+                row[i] = get_state(robot, i)
+            if positions_out is not None:
+                positions_out[j, 0] = get_x(robot)
+                positions_out[j, 1] = get_y(robot)
+        return out
+
     def get_robot_position(self):
         if self.robot is None:
             Simulation._print_warning()
             return None
-        return Simulation._dll.getRobotXCoord(self.robot), Simulation._dll.getRobotYCoord(self.robot)
+        return Simulation._get_robot_x(self.robot), Simulation._get_robot_y(self.robot)
 
     @staticmethod
     def set_seed(seed):
+        Simulation.load_library()
         Simulation._dll.setSeed(c_int(seed))
 
     def move_robot_random(self):
@@ -96,12 +241,15 @@ class Simulation:
             Simulation._print_warning()
         Simulation._dll.teleportRobotRandom(self.sim, self.robot)
         self.sensor_states = None
+        self.state = next(Simulation._states)
 
     def close(self):
         if self.sim is not None:
-            Simulation._dll.removeSimulation(self.sim)
+            Simulation._remove(self.sim)
+            self.sim = None
         if self.initial_state is not None and not self.is_copy:
-            Simulation._dll.removeSimulation(self.initial_state)
+            Simulation._remove(self.initial_state)
+            self.initial_state = None
 
     def __enter__(self):
         return self
@@ -112,17 +260,27 @@ class Simulation:
 
 class SimList:
     """
-    Creates 'num_sim' * 'num_per_ctrl' independent Simulation objects.
+    Manages up to 'num_sim' * 'num_per_ctrl' independent Simulation objects.
 
     Each of 'num_sim' controllers has its own 'num_per_ctrl' Simulation worlds.
     Simulations are linked in a sense that after reset or randomization world state
     at some fixed position (position in {0, 1, ..., num_per_ctrl - 1}) is the same for all controllers.
 
     This class is useful in various evolutionary computing algorithms.
+
+    Controller slots are allocated lazily, on first access after each replication, so 'num_sim' is only an upper
+    bound. Slots not accessed since the previous replication are released when sims are replicated again.
+    Native worlds are recycled: replicating defaults skips simulations that did not change since they were last
+    copied, and when the engine can restore worlds in place, released simulations are kept on a free-list
+    and reused instead of being freed and cloned again (see Simulation.stats).
     """
 
     def __init__(self, path, num_sim, num_per_ctrl, robot_id):
         self.list = [list() for _ in range(num_sim)]
+        self.synced = [False] * num_sim
+        self.used = 0
+        self.source = []
+        self.free = []
         self.num_per_ctrl = num_per_ctrl
         self.init_sim = Simulation(path)
         self.init_sim.set_controlled_robot(robot_id)
@@ -139,32 +297,77 @@ class SimList:
         for sim in self.default_sims:
             sim.move_robot_random()
 
-    def move_forward_defaults(self, step_size=1, max_noise=0, seed=None):
+    def move_forward_defaults(self, step_size=1, max_noise=0, seed=None, noise=None):
+        """Move default robots forward, each with its own random (dx, dy) speed noise.
+
+        Explicit noise, a list with one (dx, dy) pair per default simulation, can be given instead of max_noise,
+        which makes the move repeatable in other SimList objects.
+        """
         if seed is not None:
             np.random.seed(seed)
+        if noise is None:
+            noise = [np.random.uniform(-max_noise, max_noise, size=2) for _ in self.default_sims]
 
-        for sim in self.default_sims:
-            dx, dy = np.random.uniform(-max_noise, max_noise, size=2)
+        for sim, (dx, dy) in zip(self.default_sims, noise):
             sim.set_robot_speed(1 + dx, 1 + dy)
             sim.simulate(step_size)
 
     def replicate_sims(self, sims):
-        for i in range(len(self.list)):
-            for sim in self.list[i]:
-                sim.close()
-            self.list[i] = [sim.copy() for sim in sims]
+        """Make every controller slot a copy of sims.
+
+        Copies are made on first access to the slot. Slots not accessed since previous replication are released.
+        """
+        for ctrl_sims in self.list[self.used:]:
+            while ctrl_sims:
+                self._release(ctrl_sims.pop())
+        self.source = list(sims)
+        self.synced = [False] * len(self.list)
+        self.used = 0
+
+    def _sync(self, index):
+        ctrl_sims = self.list[index]
+        while len(ctrl_sims) > len(self.source):
+            self._release(ctrl_sims.pop())
+        for sim, source in zip(ctrl_sims, self.source):
+            sim.restore_from(source)
+        ctrl_sims.extend(self._take(source) for source in self.source[len(ctrl_sims):])
+        self.synced[index] = True
+        self.used = max(self.used, index + 1)
+
+    def allocated(self):
+        """Return number of controller slots currently holding simulations."""
+        return sum(1 for ctrl_sims in self.list if ctrl_sims)
+
+    def _take(self, source):
+        if self.free:
+            sim = self.free.pop()
+            sim.restore_from(source)
+            return sim
+        return source.copy()
+
+    def _release(self, sim):
+        if Simulation.can_restore_in_place():
+            self.free.append(sim)
+        else:
+            sim.close()
 
     def close(self):
         self.init_sim.close()
+        for sim in self.default_sims + self.free:
+            sim.close()
         for ctrl_sims in self.list:
             for sim in ctrl_sims:
                 sim.close()
 
     def __getitem__(self, item):
+        indices = range(len(self.list))[item]
+        for index in (indices if isinstance(item, slice) else [indices]):
+            if not self.synced[index]:
+                self._sync(index)
         return self.list[item]
 
     def __iter__(self):
-        return iter(self.list)
+        return iter(self[:])
 
     def __len__(self):
         return len(self.list)
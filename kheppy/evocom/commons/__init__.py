@@ -1,3 +1,4 @@
-from .base import BaseAlgorithm
+from .base import BaseAlgorithm, SteadyStateMixin
 from .individual import Controller
-from .nn import NeuralNet
+from .islands import IslandModel
+from .nn import NeuralNet, ModelArchive
@@ -3,10 +3,34 @@ from multiprocessing.pool import Pool
 import numpy as np
 import os
 from timeit import default_timer as timer
-from itertools import repeat
 
-from kheppy.core import Simulation, SimList
-from kheppy.utils import Reporter, timestamp
+from kheppy.core import BACKENDS
+from kheppy.evocom.commons.checkpoint import save_checkpoint, load_checkpoint
+from kheppy.evocom.commons.evaluation import Evaluator, WorkerPool
+from kheppy.evocom.commons.individual import run_episode
+from kheppy.evocom.commons.remote import RemotePool
+from kheppy.utils import Reporter, StreamingReporter, timestamp
+from kheppy.utils.aggregation import RunningMean
+from kheppy.utils.fitfunc import is_trajectory
+from kheppy.utils.recording import TrajectoryRecorder
+from kheppy.utils.profiling import Timers, NULL_TIMERS, PHASES, SamplingProfiler
+
+
+class SteadyStateMixin(ABC):
+    """
+    Algorithms which create and insert offspring one at a time, required by BaseAlgorithm.run_steady_state.
+    """
+
+    @abstractmethod
+    def _steady_candidate(self, pop, index):
+        """Return tuple (genome, thresholds) with offspring number 'index' of steady-state evolution and optional
+        fitness it has to beat (see Evaluator.evaluate)."""
+        pass
+
+    @abstractmethod
+    def _steady_insert(self, pop, genome, fitness, index):
+        """Insert evaluated offspring created by _steady_candidate into population (or discard it)."""
+        pass
 
 
 class BaseAlgorithm(ABC):
@@ -16,8 +40,14 @@ class BaseAlgorithm(ABC):
         self.main_params()
         self.eval_params(model=None, fitness_func=None)
         self.sim_params(wd_path=None, robot_id=None)
-        self.reporter = Reporter(['max', 'avg', 'min', 'ffe', 'start_pos'])
+        self.reporter = Reporter(['max', 'avg', 'min', 'ffe', 'cache_hits', 'bounded', 'start_pos',
+                                  'phase_time', 'phase_count'])
         self.best = None
+        self.sampler = None
+        self.remote = None
+        self._evaluator = None
+        self._migration = None
+        self._positions_log = []
 
     def main_params(self, pop_size=100, max_epochs=100, early_stop=None, max_ffe=None, param_init_limits=(-1, 1)):
         """Set evolution main parameters.
@@ -46,14 +76,17 @@ class BaseAlgorithm(ABC):
         return self
 
     def eval_params(self, model, fitness_func, num_cycles=80, steps_per_cycle=7, aggregate_func=np.mean,
-                    num_positions=1, position='static', move_step=1, move_noise=0):
+                    num_positions=1, position='static', move_step=1, move_noise=0, lockstep=False, cache_size=0,
+                    stagnation_window=0, max_cycle_fitness=None):
         """Set parameters dedicated to evaluation process.
 
         :param model: 
-        :param fitness_func: 
+        :param fitness_func: function scoring every cycle, fitness_func(sensors, left_motor, right_motor), or
+            trajectory function scoring whole episodes at once (see kheppy.utils.fitfunc.trajectory)
         :param num_cycles: 
         :param steps_per_cycle: 
-        :param aggregate_func: 
+        :param aggregate_func: function aggregating per-cycle scores of an episode, e.g. np.mean or one of
+            running aggregators of kheppy.utils.aggregation
         :param num_positions: 
         :param position: starting position policy during evolution
             static  - select random position before evolution starts, 
@@ -64,9 +97,26 @@ class BaseAlgorithm(ABC):
                     see parameters move_step and move_noise.
         :param move_step: used only when position='moving'
         :param move_noise: used only when position='moving'
+        :param lockstep: if True, all controllers and their simulations are stepped together and motor commands
+            are computed with one batched forward pass per layer in every cycle
+        :param cache_size: maximum number of memoized fitness values, 0 turns memoization off; identical genomes
+            evaluated from the same starting positions are simulated only once, cache hits are not counted as FFE
+        :param stagnation_window: number of cycles with unchanged sensor states and robot position after which
+            the robot is considered stuck and the score of its last cycle is used for all remaining cycles,
+            0 turns the rule off
+        :param max_cycle_fitness: maximum value of fitness_func in a single cycle; when given (only with
+            aggregate_func=np.mean), evaluations which can no longer beat the fitness of the solution they compete
+            with (parent in DE, particle's local best in PSO with static positions) are stopped and scored with
+            an upper bound of their fitness; stopped evaluations are counted as partial FFE, left out of reported
+            'avg' and 'min', and their total number is reported as 'bounded'
 
         :return: this object
         """
+        if max_cycle_fitness is not None and not (aggregate_func is np.mean or isinstance(aggregate_func, RunningMean)):
+            raise ValueError('Bound on fitness (max_cycle_fitness) requires aggregate_func=np.mean.')
+        if is_trajectory(fitness_func) and (stagnation_window > 0 or max_cycle_fitness is not None):
+            raise ValueError('Early termination is not supported with trajectory fitness functions.')
+
         self.params['model'] = model
         self.params['fit_func'] = fitness_func
         self.params['num_cycles'] = num_cycles
@@ -76,20 +126,85 @@ class BaseAlgorithm(ABC):
         self.params['pos'] = position
         self.params['move_step'] = move_step
         self.params['move_noise'] = move_noise
+        self.params['lockstep'] = lockstep
+        self.params['cache_size'] = cache_size
+        self.params['stagnation_window'] = stagnation_window
+        self.params['max_cycle_fitness'] = max_cycle_fitness
         return self
 
-    def sim_params(self, wd_path, robot_id, max_robot_speed=5):
+    def sim_params(self, wd_path, robot_id, max_robot_speed=5, backend='native'):
+        """Set simulation parameters.
+
+        :param wd_path: path to world description file
+        :param robot_id: id of controlled robot
+        :param max_robot_speed: motor speed corresponding to network output equal to 1
+        :param backend: simulation backend, 'native' (Khepera engine from KHEPERA_LIB) or 'numpy' (all worlds
+            simulated together as arrays, see kheppy.core.numpy_backend; physics are simplified)
+
+        :return: this object
+        """
+        if backend not in BACKENDS:
+            raise ValueError('Unsupported simulation backend {}. Use one of: {}.'.format(backend, ', '.join(BACKENDS)))
         self.params['wd_path'] = wd_path
         self.params['robot_id'] = robot_id
         self.params['max_speed'] = max_robot_speed
+        self.params['backend'] = backend
+        return self
+
+    def stream_report(self, directory, window=100):
+        """Write reported values to directory after every epoch, keeping only last 'window' epochs in memory.
+
+        See kheppy.utils.StreamingReporter and kheppy.utils.ReportReader.
+
+        :return: this object
+        """
+        self.reporter = StreamingReporter(directory, list(self.reporter.entries), window)
         return self
 
-    def _prepare_positions(self, sim_list):
+    def remote_params(self, address, authkey, chunk_size=10, job_timeout=None, wait_timeout=None):
+        """Evaluate on workers connecting over TCP (see kheppy.evocom.commons.remote) instead of local processes.
+
+        num_proc argument of run is then ignored. Workers may join and leave at any time, work of lost workers
+        is evaluated again by the others.
+
+        :param address: (host, port) at which evolution waits for workers, None turns remote evaluation off
+        :param authkey: shared secret, bytes
+        :param chunk_size: maximum number of genomes sent to a worker at once
+        :param job_timeout: seconds after which a worker which has not returned its job is considered lost
+        :param wait_timeout: seconds to wait for the first worker, None waits forever
+
+        :return: this object
+        """
+        self.remote = None
+        if address is not None:
+            self.remote = {'address': address, 'authkey': authkey, 'chunk_size': chunk_size,
+                           'job_timeout': job_timeout, 'wait_timeout': wait_timeout}
+        return self
+
+    def _update_positions(self, evaluator, method, kwargs):
+        self._positions_log.append((method, kwargs))
+        evaluator.update_positions(method, kwargs)
+
+    def _prepare_positions(self, evaluator, seed):
         if self.params['pos'] == 'dynamic':
-            sim_list.shuffle_defaults()
+            self._update_positions(evaluator, 'shuffle_defaults', {'seed': seed})
         if self.params['pos'] == 'moving':
-            sim_list.move_forward_defaults(self.params['move_step'], self.params['move_noise'])
-        sim_list.reset_to_defaults()
+            noise = np.random.uniform(-self.params['move_noise'], self.params['move_noise'],
+                                      (self.params['num_sim'], 2))
+            self._update_positions(evaluator, 'move_forward_defaults', {'step_size': self.params['move_step'],
+                                                                         'noise': noise.tolist()})
+
+    def _sim_demand(self):
+        """Return the largest number of controllers evaluated at once, used to bound SimList size."""
+        return 2 * self.params['pop_size'] + 1
+
+    def _create_evaluator(self, num_proc, timers):
+        capacity = self._sim_demand()
+        if self.remote is not None:
+            return RemotePool(self.params, capacity, timers=timers, **self.remote)
+        if num_proc == 1:
+            return Evaluator(self.params, capacity, timers)
+        return WorkerPool(self.params, capacity, num_proc, timers)
 
     @abstractmethod
     def _get_init_pop(self):
@@ -99,17 +214,70 @@ class BaseAlgorithm(ABC):
     def _get_next_pop(self, pop):
         pass
 
-    def _evaluate_pop(self, pop):
-        return pop.evaluate(self.params['sim_list'], self.params['num_cycles'], self.params['steps'],
-                            self.params['max_speed'], self.params['fit_func'], self.params['agg_func'],
-                            self.params['num_proc'])
+    def _evaluate_pop(self, pop, thresholds=None):
+        """Evaluate population.
+
+        :param thresholds: optional fitness values each controller has to beat to matter, see Evaluator.evaluate
+
+        :return: tuple (number of fitness function evaluations, simulation time)
+        """
+        evaluations = self._evaluator.evaluations
+        time = pop.evaluate(self._evaluator, thresholds)
+        return self._ffe(self._evaluator.evaluations - evaluations), time
+
+    def _ffe(self, evaluations):
+        ffe = evaluations * self.params['num_sim']
+        return int(ffe) if ffe == int(ffe) else float(ffe)
+
+    def _save_checkpoint(self, path, pop, best, state):
+        arrays = {'pop_' + key: value for key, value in pop.get_state().items()}
+        if best is not None:
+            arrays['best'] = best.genome
+        state = dict(state, best_fitness=best.fitness if best is not None else None, rng=np.random.get_state(),
+                     positions=self._positions_log, evaluator=self._evaluator.get_state(),
+                     reporter=self.reporter.get_state())
+        save_checkpoint(path, arrays, state)
+
+    def _load_checkpoint(self, path, pop):
+        arrays, state = load_checkpoint(path)
+        pop.set_state({key[len('pop_'):]: value for key, value in arrays.items() if key.startswith('pop_')})
+        best = None
+        if state['best_fitness'] is not None:
+            best = pop.controller_type(pop.network, arrays['best'], state['best_fitness'])
+
+        for method, kwargs in state['positions']:
+            self._update_positions(self._evaluator, method, kwargs)
+        self._evaluator.set_state(state['evaluator'])
+        self.reporter.set_state(state['reporter'])
+        np.random.set_state(state['rng'])
+        return best, state
 
-    def run(self, output_dir=None, num_proc=1, seed=42, verbose=False):
+    def _running(self, epoch, no_change, ffe):
+        return epoch < self.params['epochs'] and no_change < self.params['stop'] and ffe <= self.params['ffe']
+
+    def run(self, output_dir=None, num_proc=1, seed=42, verbose=False, checkpoint_path=None, checkpoint_every=10,
+            resume_from=None, profile=False, sample_epoch=None):
+        """Run evolution.
+
+        :param output_dir: directory where the best network is saved, None turns saving off
+        :param num_proc: number of evaluation processes
+        :param seed: random seed
+        :param verbose: print progress after every epoch
+        :param checkpoint_path: file to which evolution state is written every checkpoint_every epochs and after
+            the last epoch, None turns checkpoints off
+        :param checkpoint_every: number of epochs between checkpoints
+        :param resume_from: checkpoint file written by previous run with the same parameters; evolution continues
+            exactly as if it had not been interrupted (seed argument is then ignored)
+        :param profile: measure time spent in every phase of evolution (see kheppy.utils.profiling.PHASES),
+            reported per epoch as 'phase_time' (seconds) and 'phase_count' (number of measurements)
+        :param sample_epoch: number of epoch (counted from 1) during which main process is sampled by
+            kheppy.utils.profiling.SamplingProfiler, available afterwards as 'sampler' attribute
+        """
         np.random.seed(seed)
-        with SimList(self.params['wd_path'], 2 * self.params['pop_size'] + 1, self.params['num_sim'],
-                     self.params['robot_id']) as sim_list:
-            self.params['sim_list'] = sim_list
-            self.params['num_proc'] = num_proc
+        self.sampler = None
+        with self._create_evaluator(num_proc, Timers() if profile else NULL_TIMERS) as evaluator:
+            self._evaluator = evaluator
+            self._positions_log = []
 
             if verbose:
                 print('Using {} simulation(s) per controller.'.format(self.params['num_sim']))
@@ -117,25 +285,43 @@ class BaseAlgorithm(ABC):
             pop = self._get_init_pop()
             best, no_change, i, ffe = None, 0, 0, 0
 
-            sim_list.shuffle_defaults(seed=seed)
-            sim_list.reset_to_defaults()
+            if resume_from is None:
+                self._update_positions(evaluator, 'shuffle_defaults', {'seed': seed})
+            else:
+                best, state = self._load_checkpoint(resume_from, pop)
+                no_change, i, ffe, seed = state['no_change'], state['epoch'], state['ffe'], state['seed']
+                if verbose:
+                    print('Resuming from epoch {}.'.format(i))
 
-            while i < self.params['epochs'] and no_change < self.params['stop'] and ffe <= self.params['ffe']:
+            while self._running(i, no_change, ffe):
 
                 if verbose:
                     print('Epoch {:>3} '.format(i + 1), end='', flush=True)
                 start = timer()
-                pop, epoch_ffe, epoch_sim_time = self._get_next_pop(pop)
+                if sample_epoch == i + 1:
+                    with SamplingProfiler() as self.sampler:
+                        pop, epoch_ffe, epoch_sim_time = self._get_next_pop(pop)
+                else:
+                    pop, epoch_ffe, epoch_sim_time = self._get_next_pop(pop)
                 ffe += epoch_ffe
 
                 if verbose:
                     print('finished in {:>5.2f}s (simulation: {:>5.2f}s) | max fitness: {:.4f} | '
                           'average fitness: {:.4f} | min fitness: {:.4f}. Total FFE: {:>8}.'
                           .format(timer() - start, epoch_sim_time, pop.best().fitness, pop.average_fitness(),
-                                  pop.worst().fitness, ffe))
-                self.reporter.put(['max', 'avg', 'min', 'ffe', 'start_pos'],
+                                  pop.worst().fitness, ffe), end='')
+                    print(' Cache hits: {:>8}.'.format(evaluator.hits * self.params['num_sim'])
+                          if evaluator.cache is not None else '')
+                self.reporter.put(['max', 'avg', 'min', 'ffe', 'cache_hits', 'bounded', 'start_pos'],
                                   [pop.best().fitness, pop.average_fitness(), pop.worst().fitness, ffe,
-                                  [sim.get_robot_position() for sim in sim_list.default_sims]])
+                                   evaluator.hits * self.params['num_sim'], evaluator.cutoffs,
+                                   evaluator.start_positions()])
+                if evaluator.timers.enabled:
+                    phase_time, phase_count = evaluator.pop_timers()
+                    self.reporter.put(['phase_time', 'phase_count'], [phase_time, phase_count])
+                    if verbose:
+                        print('  ' + ' | '.join('{}: {:.3f}s'.format(phase, seconds)
+                                                for phase, seconds in zip(PHASES, phase_time) if seconds > 0))
 
                 if best is not None and pop.best().fitness - best.fitness < 0.0001:
                     no_change += 1
@@ -144,7 +330,13 @@ class BaseAlgorithm(ABC):
                     no_change = 0
                 i += 1
 
-                self._prepare_positions(sim_list)
+                if self._migration is not None:
+                    ffe += self._migration(self, i, pop)
+                self._prepare_positions(evaluator, seed + i)
+
+                if checkpoint_path is not None and (i % checkpoint_every == 0 or not self._running(i, no_change, ffe)):
+                    self._save_checkpoint(checkpoint_path, pop, best,
+                                          {'epoch': i, 'no_change': no_change, 'ffe': ffe, 'seed': seed})
 
             if output_dir is not None:
                 if not os.path.exists(output_dir):
@@ -153,10 +345,91 @@ class BaseAlgorithm(ABC):
             if verbose:
                 print('Evolution finished after {} iterations with total of {} FFE.'.format(i, ffe))
             self.best = best
+            self._evaluator = None
+
+    def run_steady_state(self, num_proc=1, seed=42, report_every=None, verbose=False):
+        """Run asynchronous steady-state evolution, without a barrier between generations.
+
+        Offspring are created one at a time and inserted into the population as soon as their fitness is known,
+        while two of them per evaluation process (or remote worker) are being evaluated, so no process waits for
+        the slowest evaluation of a generation. Every pop_size evaluations count as one epoch of stop conditions.
+        Population statistics are reported every report_every evaluations (pop_size by default). Requires
+        position='static'.
+        With num_proc > 1 results depend on the order in which evaluations finish, so they are not reproducible.
+
+        :param num_proc: number of evaluation processes
+        :param seed: random seed
+        :param report_every: number of evaluations between reports
+        :param verbose: print progress after every report
+        """
+        if not isinstance(self, SteadyStateMixin):
+            raise TypeError('{} does not support steady-state evolution.'.format(type(self).__name__))
+        if self.params['pos'] != 'static':
+            raise ValueError('Steady-state evolution requires position=\'static\'.')
+        pop_size = self.params['pop_size']
+        report_every = report_every or pop_size
+        np.random.seed(seed)
+        with self._create_evaluator(num_proc, NULL_TIMERS) as evaluator:
+            self._evaluator = evaluator
+            self._positions_log = []
+
+            pop = self._get_init_pop()
+            self._update_positions(evaluator, 'shuffle_defaults', {'seed': seed})
+            ffe, _ = self._evaluate_pop(pop)
+            best, no_change, created, evaluated = pop.best().copy(), 0, 0, 0
+
+            while True:
+                running = self._running(evaluated // pop_size, no_change, ffe)
+                while running and evaluator.pending() < 2 * evaluator.num_workers:
+                    genome, thresholds = self._steady_candidate(pop, created)
+                    evaluator.submit(genome[None], (genome, created), thresholds)
+                    created += 1
+                if not evaluator.pending():
+                    break
+
+                for (genome, index), fitness, _ in evaluator.collect():
+                    self._steady_insert(pop, genome, fitness[0], index)
+                    evaluated += 1
+                    ffe = self._ffe(evaluator.evaluations)
+                    if evaluated % report_every == 0:
+                        self.reporter.put(['max', 'avg', 'min', 'ffe', 'cache_hits', 'bounded', 'start_pos'],
+                                          [pop.best().fitness, pop.average_fitness(), pop.worst().fitness, ffe,
+                                           evaluator.hits * self.params['num_sim'], evaluator.cutoffs,
+                                           evaluator.start_positions()])
+                        if verbose:
+                            print('Evaluations {:>8} | max fitness: {:.4f} | average fitness: {:.4f} | '
+                                  'min fitness: {:.4f}. Total FFE: {:>8}.'
+                                  .format(evaluated, pop.best().fitness, pop.average_fitness(), pop.worst().fitness,
+                                          ffe))
+                    if evaluated % pop_size == 0:
+                        if pop.best().fitness - best.fitness < 0.0001:
+                            no_change += 1
+                        else:
+                            best = pop.best().copy()
+                            no_change = 0
+
+            if pop.best().fitness > best.fitness:
+                best = pop.best().copy()
+            if verbose:
+                print('Evolution finished after {} evaluations with total of {} FFE.'.format(evaluated, ffe))
+            self.best = best
+            self._evaluator = None
+
+    @staticmethod
+    def _test(params, genome, seed_offset, seed, num_points, num_cycles, progress=None, record_to=None):
+        """Evaluate genome in num_points consecutive random starting positions of the sequence drawn from seed,
+        skipping its first seed_offset positions.
 
-    def _test(self, seed_offset, seed, num_points, num_cycles, controller):
-        with Simulation(self.params['wd_path']) as sim:
-            sim.set_controlled_robot(self.params['robot_id'])
+        Takes only picklable arguments, so that shards of a test can be run in other processes.
+
+        :param progress: optional function called with number of evaluated points after every evaluation
+        :param record_to: optional directory of TrajectoryRecorder, episode seed_offset + i is written for point i
+        """
+        model = params['model']
+        weights, biases = model.unpack(genome)
+        recorder = TrajectoryRecorder(record_to, mode='r+') if record_to is not None else None
+        with BACKENDS[params['backend']][0](params['wd_path']) as sim:
+            sim.set_controlled_robot(params['robot_id'])
             sim.set_seed(seed)
             for i in range(seed_offset):
                 sim.move_robot_random()
@@ -164,35 +437,62 @@ class BaseAlgorithm(ABC):
             res = []
             for i in range(num_points):
                 sim.move_robot_random()
-                controller.reset_fitness()
-                controller.evaluate(sim, self.params['model'], num_cycles, self.params['max_speed'],
-                                    self.params['steps'], self.params['fit_func'], np.mean)
-                res.append(controller.fitness)
-            return res
+                record = None
+                if recorder is not None:
+                    start, record = sim.get_robot_position(), recorder.episode(seed_offset + i)
+                fitness, _ = run_episode(sim, model, weights, biases, num_cycles, params['steps'],
+                                         params['max_speed'], params['fit_func'], np.mean, record=record)
+                if recorder is not None:
+                    recorder.finish(seed_offset + i, num_cycles, fitness, start)
+                res.append(fitness)
+                if progress is not None:
+                    progress(i + 1)
+        if recorder is not None:
+            recorder.close()
+        return res
+
+    def test(self, seed=50, num_points=1000, num_cycles=160, controller=None, verbose=False, num_proc=1,
+             record_to=None):
+        """Evaluate controller (the best one found by default) in num_points random starting positions.
+
+        :param num_proc: number of processes; starting positions are split into consecutive shards, results are
+            the same as with a single process
+        :param record_to: directory to which sensor states, motor outputs and positions of every cycle are written
+            (one episode per starting position), see kheppy.utils.recording.Trajectories for reading them
 
-    def test(self, seed=50, num_points=1000, num_cycles=160, controller=None, verbose=False):
+        :return: list of fitness values, one per starting position
+        """
         if controller is None:
-            controller = self.best.copy()
-        else:
-            controller = controller.copy()
+            controller = self.best
+        genome = np.array(controller.genome, self.params['model'].dtype)
 
         if verbose:
             print('Testing using {} starting points. Single evaluation length = {} cycles.'
                   .format(num_points, num_cycles))
 
-        res = []
-        with Simulation(self.params['wd_path']) as sim:
-            sim.set_controlled_robot(self.params['robot_id'])
-            sim.set_seed(seed)
-            for i in range(num_points):
-                sim.move_robot_random()
-                controller.reset_fitness()
-                controller.evaluate(sim, self.params['model'], num_cycles, self.params['max_speed'],
-                                    self.params['steps'], self.params['fit_func'], np.mean)
-                res.append(controller.fitness)
-                if verbose:
-                    print('\rTesting progress: {:5.2f}%...'.format(100. * (i + 1) / num_points), end='', flush=True)
+        def progress(done):
+            if verbose:
+                print('\rTesting progress: {:5.2f}%...'.format(100. * done / num_points), end='', flush=True)
+
+        if record_to is not None:
+            TrajectoryRecorder(record_to, num_points, num_cycles, self.params['model'].input_len).close()
+        if num_proc == 1:
+            res = BaseAlgorithm._test(self.params, genome, 0, seed, num_points, num_cycles, progress, record_to)
+        else:
+            # more shards than processes give finer progress reports and better balance
+            bounds = np.linspace(0, num_points, min(num_points, 4 * num_proc) + 1).astype(int)
+            shards = [(self.params, genome, start, seed, stop - start, num_cycles, None, record_to)
+                      for start, stop in zip(bounds[:-1], bounds[1:])]
+            res = []
+            with Pool(num_proc) as pool:
+                for shard_res in pool.imap(_run_test_shard, shards):
+                    res.extend(shard_res)
+                    progress(len(res))
         if verbose:
             print('\nAverage fitness in test: {:.4f}.'.format(np.mean(res)))
 
         return res
+
+
+def _run_test_shard(args):
+    return BaseAlgorithm._test(*args)
@@ -0,0 +1,34 @@
+import os
+import pickle
+import numpy as np
+
+
+def save_checkpoint(path, arrays, meta):
+    """Atomically write checkpoint file.
+
+    Arrays are stored raw in an uncompressed .npz container, other (picklable) state is stored as one pickled blob.
+    Checkpoint is first written to a temporary file which then replaces 'path', so an interrupted write never
+    leaves a corrupted checkpoint behind.
+
+    :param path: checkpoint file path
+    :param arrays: dictionary of NumPy arrays
+    :param meta: picklable object
+    """
+    tmp_path = path + '.tmp'
+    blob = np.frombuffer(pickle.dumps(meta, protocol=pickle.HIGHEST_PROTOCOL), dtype=np.uint8)
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, _meta=blob, **arrays)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def load_checkpoint(path):
+    """Read checkpoint written by save_checkpoint.
+
+    :return: tuple (arrays, meta)
+    """
+    with np.load(path, allow_pickle=False) as data:
+        arrays = {key: data[key] for key in data.files if key != '_meta'}
+        meta = pickle.loads(data['_meta'].tobytes())
+    return arrays, meta
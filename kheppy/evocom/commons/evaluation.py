@@ -0,0 +1,639 @@
+from collections import OrderedDict, deque
+import hashlib
+import multiprocessing
+from multiprocessing.connection import wait
+import numpy as np
+from timeit import default_timer as timer
+
+from kheppy.core import Simulation, BACKENDS
+from kheppy.evocom.commons.individual import run_episode
+from kheppy.evocom.commons.termination import EpisodeMonitor
+from kheppy.utils.aggregation import RunningAggregator
+from kheppy.utils.fitfunc import is_trajectory
+from kheppy.utils.profiling import Timers, NULL_TIMERS
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # Python < 3.8
+    shared_memory = None
+
+
+def evaluate_lockstep(network, genomes, sims, num_cycles, steps_per_cycle, max_speed, eval_func, aggregate_func,
+                      timers=NULL_TIMERS, monitor=None):
+    """Evaluate many controllers by stepping all of their simulations in lockstep.
+
+    In every cycle sensor states of all simulations are gathered into one array and motor commands are computed
+    with a single batched forward pass per layer. Results are the same as evaluating each controller separately
+    with Controller.evaluate and averaging over its simulations.
+
+    :param network: NeuralNet shared by all controllers
+    :param genomes: genome matrix of shape (num_controllers, genome_len)
+    :param sims: list of simulation lists, one list (of equal length) per controller
+    :param timers: kheppy.utils.profiling.Timers measuring time of evaluation phases
+    :param monitor: EpisodeMonitor with one episode per simulation (in order of sims), only its active episodes
+        are simulated
+    :param eval_func: per-cycle or trajectory fitness function (see kheppy.utils.fitfunc.trajectory), trajectories
+        of all simulations are scored with one call
+    :param aggregate_func: aggregating function; a RunningAggregator is updated every cycle, without keeping
+        scores of all cycles, unless the monitor has a rule turned on
+
+    :return: tuple (fitness array of shape (num_controllers,), total simulation time)
+    """
+    if len(genomes) == 0:
+        return np.zeros(0), 0
+
+    flat_sims = [sim for ctrl_sims in sims for sim in ctrl_sims]
+    shape = (len(genomes), len(sims[0]))
+    if monitor is None:
+        monitor = EpisodeMonitor(shape[0], shape[1], num_cycles)
+    weights, biases = network.unpack(genomes)
+    time = 0
+
+    timers.lap()
+    sensors = Simulation.read_sensors_many(flat_sims, np.empty((len(flat_sims), flat_sims[0].sensor_count),
+                                                               network.dtype))
+    positions = np.empty((len(flat_sims), 2)) if monitor.stagnation_window > 0 else None
+    log = _TrajectoryLog(num_cycles, sensors.shape) if is_trajectory(eval_func) else None
+    running = _running_state(aggregate_func, monitor, log)
+    timers.lap('sensors')
+    for i in range(num_cycles):
+        episodes = monitor.active_episodes()
+        if len(episodes) == 0:
+            break
+        motors = network.predict_batch(np.reshape(sensors, shape + (-1,)), weights, biases).reshape(-1, 2)
+        timers.lap('inference')
+        if len(episodes) < len(flat_sims):
+            active_sims, motors = [flat_sims[j] for j in episodes], motors[episodes]
+        else:
+            active_sims = flat_sims
+        for sim, (left, right) in zip(active_sims, motors):
+            sim.set_robot_speed(left * max_speed, right * max_speed)
+        start = timer()
+        for sim in active_sims:
+            sim.simulate(steps_per_cycle)
+        time += timer() - start
+        timers.lap('stepping')
+        if active_sims is flat_sims:
+            active_sensors, active_positions = sensors, positions
+        else:
+            active_sensors = np.empty((len(episodes), sensors.shape[1]), sensors.dtype)
+            active_positions = np.empty((len(episodes), 2)) if positions is not None else None
+        Simulation.read_sensors_many(active_sims, active_sensors, active_positions)
+        if active_sims is not flat_sims:
+            sensors[episodes] = active_sensors
+        timers.lap('sensors')
+        if log is not None:
+            log.put(i, active_sensors, motors)
+            continue
+        scores = [eval_func(states, left, right) for states, (left, right) in zip(active_sensors, motors)]
+        if running is not None:
+            running = aggregate_func.update(running, i, np.array(scores))
+        else:
+            monitor.record(i, episodes, scores, active_sensors, active_positions)
+        timers.lap('fitness')
+
+    if log is not None:
+        monitor.record_trajectories(log.score(eval_func))
+        timers.lap('fitness')
+    if running is not None:
+        return aggregate_func.result(running, num_cycles).reshape(shape).mean(axis=1), time
+    return monitor.fitness(aggregate_func), time
+
+
+def evaluate_batch(network, genomes, sim_list, num_cycles, steps_per_cycle, max_speed, eval_func, aggregate_func,
+                   timers=NULL_TIMERS, monitor=None):
+    """Evaluate many controllers in worlds of NumpySimList, stepping and reading all of them with array operations.
+
+    Results are the same as of evaluate_lockstep with simulations of sim_list.
+
+    :param sim_list: NumpySimList with at least len(genomes) controller slots, reset to starting positions
+    :param monitor: EpisodeMonitor with one episode per batch row, only its active episodes are simulated
+
+    :return: tuple (fitness array of shape (num_controllers,), total simulation time)
+    """
+    if len(genomes) == 0:
+        return np.zeros(0), 0
+
+    batch, robot, rows = sim_list.batch, sim_list.robot, sim_list.rows(len(genomes))
+    shape = (len(genomes), sim_list.num_per_ctrl)
+    if monitor is None:
+        monitor = EpisodeMonitor(shape[0], shape[1], num_cycles)
+    weights, biases = network.unpack(genomes)
+    num_episodes = shape[0] * shape[1]
+    time = 0
+
+    timers.lap()
+    sensors = batch.get_sensor_states(robot, rows, np.empty((num_episodes, len(batch.world.sensors[robot])),
+                                                            network.dtype))
+    log = _TrajectoryLog(num_cycles, sensors.shape) if is_trajectory(eval_func) else None
+    running = _running_state(aggregate_func, monitor, log)
+    timers.lap('sensors')
+    for i in range(num_cycles):
+        episodes = monitor.active_episodes()
+        if len(episodes) == 0:
+            break
+        motors = network.predict_batch(np.reshape(sensors, shape + (-1,)), weights, biases).reshape(-1, 2)
+        timers.lap('inference')
+        # batch rows of controller slots start at 0, so episode numbers are row indices
+        active_rows = rows if len(episodes) == num_episodes else episodes
+        motors = motors[active_rows]
+        batch.set_speed(robot, motors[:, 0] * max_speed, motors[:, 1] * max_speed, active_rows)
+        start = timer()
+        batch.simulate(steps_per_cycle, active_rows)
+        time += timer() - start
+        timers.lap('stepping')
+        if active_rows is rows:
+            active_sensors = batch.get_sensor_states(robot, rows, sensors)
+        else:
+            active_sensors = batch.get_sensor_states(robot, active_rows, np.empty((len(episodes), sensors.shape[1]),
+                                                                                  sensors.dtype))
+            sensors[episodes] = active_sensors
+        timers.lap('sensors')
+        if log is not None:
+            log.put(i, active_sensors, motors)
+            continue
+        scores = [eval_func(states, left, right) for states, (left, right) in zip(active_sensors, motors)]
+        if running is not None:
+            running = aggregate_func.update(running, i, np.array(scores))
+            timers.lap('fitness')
+            continue
+        positions = None
+        if monitor.stagnation_window > 0:
+            positions = np.stack([batch.x[active_rows, robot], batch.y[active_rows, robot]], axis=1)
+        monitor.record(i, episodes, scores, active_sensors, positions)
+        timers.lap('fitness')
+
+    if log is not None:
+        monitor.record_trajectories(log.score(eval_func))
+        timers.lap('fitness')
+    if running is not None:
+        return aggregate_func.result(running, num_cycles).reshape(shape).mean(axis=1), time
+    return monitor.fitness(aggregate_func), time
+
+
+def _running_state(aggregate_func, monitor, log):
+    """Return initial state of RunningAggregator, when scores of all episodes can be aggregated cycle by cycle."""
+    if isinstance(aggregate_func, RunningAggregator) and not monitor.enabled and log is None:
+        return aggregate_func.start()
+    return None
+
+
+class _TrajectoryLog:
+    """Sensor states and motor commands of all episodes in every cycle, scored at once by trajectory fitness."""
+
+    def __init__(self, num_cycles, sensors_shape):
+        self.sensors = np.empty((sensors_shape[0], num_cycles, sensors_shape[1]))
+        self.motors = np.empty((sensors_shape[0], num_cycles, 2))
+
+    def put(self, cycle, sensors, motors):
+        self.sensors[:, cycle] = sensors
+        self.motors[:, cycle] = motors
+
+    def score(self, eval_func):
+        """Return scores of shape (num_episodes, num_cycles)."""
+        return eval_func(self.sensors, self.motors)
+
+
+class FitnessCache:
+    """
+    Bounded LRU mapping of (starting positions fingerprint, genome digest) to fitness value.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+
+    @staticmethod
+    def digest(genome):
+        return hashlib.blake2b(np.ascontiguousarray(genome).tobytes(), digest_size=16).digest()
+
+    def get(self, key):
+        value = self.entries.get(key)
+        if value is not None:
+            self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class Evaluator:
+    """
+    Evaluates genome matrices in the current process using its own SimList.
+
+    'params' is a dictionary with the evaluation and simulation parameters of BaseAlgorithm ('model', 'fit_func',
+    'agg_func', 'num_cycles', 'steps', 'max_speed', 'lockstep', 'cache_size', 'wd_path', 'robot_id', 'num_sim',
+    'backend', 'stagnation_window', 'max_cycle_fitness'). With 'numpy' backend all controllers are evaluated
+    together with evaluate_batch.
+    Starting positions are changed only through update_positions, so that every Evaluator given the same sequence
+    of updates holds the same worlds.
+
+    When 'cache_size' is positive, identical genomes are evaluated once per call and fitness values are memoized
+    until starting positions change. Counters 'evaluations' (genomes actually simulated), 'hits' (genomes served
+    from cache or duplicates) and 'cutoffs' (genomes scored with an upper bound of fitness, see EpisodeMonitor) are
+    kept. After every evaluate, 'bounded' marks genomes scored with an upper bound. Time of evaluation phases is
+    measured by 'timers' (off by default).
+
+    Besides evaluate, jobs can be submitted without waiting for them (submit, collect), which lets WorkerPool keep
+    all workers busy in steady-state evolution.
+    """
+
+    def __init__(self, params, capacity, timers=NULL_TIMERS):
+        self.params = params
+        self.timers = timers
+        sim_list_type = BACKENDS[params['backend']][1]
+        self.sim_list = sim_list_type(params['wd_path'], capacity, params['num_sim'], params['robot_id'])
+        self.needs_reset = False
+        self.positions_version = 0
+        self.cache = FitnessCache(params['cache_size']) if params['cache_size'] else None
+        self.evaluations = 0
+        self.hits = 0
+        self.cutoffs = 0
+        self.bounded = np.zeros(0, dtype=bool)
+        self._done = []
+
+    def update_positions(self, method, kwargs):
+        """Call SimList method (e.g. 'shuffle_defaults') with kwargs and reset all simulations to new defaults."""
+        self.timers.lap()
+        getattr(self.sim_list, method)(**kwargs)
+        self.timers.lap('replication')
+        self.needs_reset = True
+        self.positions_version += 1
+
+    def start_positions(self):
+        return [sim.get_robot_position() for sim in self.sim_list.default_sims]
+
+    def evaluate(self, genomes, thresholds=None):
+        """Evaluate every row of genome matrix.
+
+        With early termination turned on (see BaseAlgorithm.eval_params) evaluations are stopped when their
+        outcome is known, and 'evaluations' counts simulated cycles as fractions of full evaluations.
+
+        :param thresholds: optional fitness values the genomes have to beat to matter (e.g. fitness of parents),
+            with 'max_cycle_fitness' set genomes which cannot reach them are scored with an upper bound of fitness
+
+        :return: tuple (fitness array, simulation time)
+        """
+        if self.cache is None:
+            fitness, time, work, self.bounded = self._evaluate(genomes, thresholds)
+            self.evaluations += work.sum()
+            self.cutoffs += int(np.count_nonzero(self.bounded))
+            return fitness, time
+
+        pending = OrderedDict()
+        fitness = np.empty(len(genomes))
+        self.bounded = np.zeros(len(genomes), dtype=bool)
+        for i, genome in enumerate(genomes):
+            key = (self.positions_version, FitnessCache.digest(genome))
+            value = self.cache.get(key)
+            if value is None:
+                pending.setdefault(key, []).append(i)
+            else:
+                fitness[i] = value
+
+        time = 0
+        if pending:
+            pending_thresholds = None
+            if thresholds is not None:
+                pending_thresholds = np.array([np.min(thresholds[rows]) for rows in pending.values()])
+            new_fitness, time, work, bounded = self._evaluate(genomes[[rows[0] for rows in pending.values()]],
+                                                              pending_thresholds)
+            for (key, rows), value, is_bound in zip(pending.items(), new_fitness, bounded):
+                fitness[rows] = value
+                self.bounded[rows] = is_bound
+                if not is_bound:
+                    self.cache.put(key, value)
+            self.evaluations += work.sum()
+            self.cutoffs += int(np.count_nonzero(bounded))
+        self.hits += len(genomes) - len(pending)
+        return fitness, time
+
+    def submit(self, genomes, tag, thresholds=None):
+        """Start evaluation of genome matrix, its result is returned by collect together with 'tag'.
+
+        Evaluator evaluates the genomes at once, WorkerPool sends them to the least busy worker and returns.
+        Cache is not used.
+        """
+        self._finish(tag, *self._evaluate(genomes, thresholds))
+
+    @property
+    def num_workers(self):
+        """Number of processes evaluating submitted jobs in parallel."""
+        return 1
+
+    def pending(self):
+        """Return number of submitted jobs not returned by collect yet."""
+        return len(self._done)
+
+    def collect(self):
+        """Return list of tuples (tag, fitness array, simulation time) of finished jobs, waiting for at least one
+        if jobs are pending and none has finished."""
+        done, self._done = self._done, []
+        return done
+
+    def _finish(self, tag, fitness, time, work, bounded):
+        self.evaluations += work.sum()
+        self.cutoffs += int(np.count_nonzero(bounded))
+        self._done.append((tag, fitness, time))
+
+    def get_state(self):
+        """Return picklable counters and cache content, see set_state."""
+        return {'evaluations': self.evaluations, 'hits': self.hits, 'cutoffs': self.cutoffs,
+                'cache': list(self.cache.entries.items()) if self.cache is not None else None}
+
+    def set_state(self, state):
+        self.evaluations = state['evaluations']
+        self.hits = state['hits']
+        self.cutoffs = state.get('cutoffs', 0)
+        if self.cache is not None and state['cache'] is not None:
+            self.cache.entries = OrderedDict(state['cache'])
+
+    def pop_timers(self):
+        """Return measurements of timers gathered since the previous call, see Timers.pop."""
+        return self.timers.pop()
+
+    def _evaluate(self, genomes, thresholds=None):
+        """Evaluate genomes without cache.
+
+        :return: tuple (fitness array, simulation time, fraction of cycles simulated per genome,
+            mask of genomes scored with an upper bound)
+        """
+        if len(genomes) > len(self.sim_list):
+            raise ValueError('Cannot evaluate {} genomes using {} simulation slots.'
+                             .format(len(genomes), len(self.sim_list)))
+        self.timers.lap()
+        if self.needs_reset:
+            self.sim_list.reset_to_defaults()
+        self.needs_reset = True
+
+        p = self.params
+        args = (p['num_cycles'], p['steps'], p['max_speed'], p['fit_func'], p['agg_func'])
+        monitor = EpisodeMonitor(len(genomes), p['num_sim'], p['num_cycles'], p['stagnation_window'],
+                                 p['max_cycle_fitness'], thresholds)
+        if p['backend'] == 'numpy':
+            self.timers.lap('replication')
+            fitness, time = evaluate_batch(p['model'], genomes, self.sim_list, *args, timers=self.timers,
+                                           monitor=monitor)
+        else:
+            sims = self.sim_list[:len(genomes)]
+            self.timers.lap('replication')
+            # bound rule is applied after every cycle of all episodes of a controller, which are stepped together
+            if p['lockstep'] or monitor.thresholds is not None:
+                fitness, time = evaluate_lockstep(p['model'], genomes, sims, *args, timers=self.timers,
+                                                  monitor=monitor)
+            else:
+                fitness, time = self._evaluate_serial(genomes, sims, args, monitor if monitor.enabled else None)
+        work = monitor.work() if monitor.enabled else np.ones(len(genomes))
+        return fitness, time, work, monitor.bounded
+
+    def _evaluate_serial(self, genomes, sims, args, monitor):
+        model = self.params['model']
+        fitness, time = np.zeros(len(genomes)), 0
+        for i, (genome, ctrl_sims) in enumerate(zip(genomes, sims)):
+            weights, biases = model.unpack(genome)
+            for k, sim in enumerate(ctrl_sims):
+                episode = i * len(ctrl_sims) + k
+                if monitor is not None and not monitor.active[episode]:
+                    continue
+                sim_fitness, sim_time = run_episode(sim, model, weights, biases, *args, timers=self.timers,
+                                                    monitor=monitor, episode=episode)
+                fitness[i] += sim_fitness
+                time += sim_time
+            fitness[i] /= len(ctrl_sims)
+        if monitor is not None:
+            fitness = monitor.fitness(self.params['agg_func'])
+        return fitness, time
+
+    def close(self):
+        self.sim_list.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class SharedArrays:
+    """
+    NumPy arrays laid out in one multiprocessing.shared_memory block, created by one process (name=None) and
+    attached by others with the name of the block and the same specs.
+
+    :param specs: list of tuples (key, shape, dtype), arrays are available as 'arrays' dictionary
+    """
+
+    def __init__(self, specs, name=None):
+        offsets, size = [], 0
+        for _, shape, dtype in specs:
+            dtype = np.dtype(dtype)
+            size += -size % dtype.alignment
+            offsets.append(size)
+            size += int(np.prod(shape)) * dtype.itemsize
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        else:
+            self.shm = shared_memory.SharedMemory(name)
+        self.specs = specs
+        self.arrays = {key: np.ndarray(shape, dtype, self.shm.buf, offset)
+                       for (key, shape, dtype), offset in zip(specs, offsets)}
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def close(self):
+        self.arrays = {}
+        self.shm.close()
+
+    def unlink(self):
+        self.shm.unlink()
+
+
+def _exchange_specs(capacity, dtype):
+    """Specs of SharedArrays through which WorkerPool exchanges genomes, thresholds and results."""
+    return [('genomes', (capacity[0], capacity[1]), dtype), ('thresholds', (capacity[0],), float),
+            ('fitness', (capacity[0],), float), ('work', (capacity[0],), float), ('bounded', (capacity[0],), bool)]
+
+
+def _evaluate_shared(evaluator, arrays, start, stop, with_thresholds):
+    """Evaluate rows start:stop of shared genome matrix, write results to shared arrays and return time."""
+    thresholds = arrays['thresholds'][start:stop] if with_thresholds else None
+    fitness, time, work, bounded = evaluator._evaluate(arrays['genomes'][start:stop], thresholds)
+    arrays['fitness'][start:stop] = fitness
+    arrays['work'][start:stop] = work
+    arrays['bounded'][start:stop] = bounded
+    return time
+
+
+def _worker_loop(conn, params, capacity, profile, shared=None):
+    start = timer()
+    exchange = None
+    if shared is not None:
+        try:
+            exchange = SharedArrays(shared[1], shared[0])
+        except OSError:
+            pass
+    with Evaluator(params, capacity, Timers() if profile else NULL_TIMERS) as evaluator:
+        conn.send((exchange is not None, timer() - start))
+        while True:
+            command, args = conn.recv()
+            if command == 'close':
+                break
+            start = timer()
+            try:
+                if command == 'evaluate_shared':
+                    result = _evaluate_shared(evaluator, exchange.arrays, *args)
+                else:
+                    result = getattr(evaluator, command)(*args)
+            except Exception as e:
+                result = e
+            conn.send((result, timer() - start))
+    if exchange is not None:
+        exchange.close()
+    conn.close()
+
+
+class WorkerPool(Evaluator):
+    """
+    Evaluates genome matrices using long-lived worker processes.
+
+    Every worker loads the world file once and keeps its own SimList partition, which is reset in place between
+    evaluations. Only genome blocks, fitness values and starting position updates are sent between processes,
+    so workers can be started with any multiprocessing start method.
+
+    Workers measure their phases when 'timers' are on; pop_timers sums them over workers, so they are process
+    times rather than wall time. Phase 'ipc' is the part of every round trip not spent in the slowest worker.
+
+    Submitted jobs have to be collected before any other method is called.
+
+    Genomes to evaluate are copied into a block of shared memory (see SharedArrays) and workers write fitness
+    values next to them, so only row ranges travel through pipes and IPC cost does not grow with population or
+    genome size. When shared memory is not available (Python < 3.8, no space for the block, a worker cannot attach
+    it), genome blocks are sent through pipes.
+    """
+
+    def __init__(self, params, capacity, num_proc, timers=NULL_TIMERS):
+        super().__init__(params, 0, timers)
+        self.workers = []
+        self.capacity = capacity
+        self.exchange = None
+        shared = None
+        if shared_memory is not None and params['model'] is not None:
+            specs = _exchange_specs((capacity, params['model'].genome_len), params['model'].dtype)
+            try:
+                self.exchange = SharedArrays(specs)
+                shared = (self.exchange.name, specs)
+            except OSError:
+                pass
+        per_worker = -(-capacity // num_proc)
+        start = timer()
+        try:
+            for _ in range(num_proc):
+                conn, child_conn = multiprocessing.Pipe()
+                process = multiprocessing.Process(target=_worker_loop, args=(child_conn, params, per_worker,
+                                                                             timers.enabled, shared), daemon=True)
+                process.start()
+                child_conn.close()
+                self.workers.append((process, conn))
+            attached = [conn.recv()[0] for _, conn in self.workers]
+        except BaseException:
+            for process, conn in self.workers:
+                process.terminate()
+                process.join()
+                conn.close()
+            self.workers = []
+            if self.exchange is not None:
+                self._release_exchange()
+            raise
+        if self.exchange is not None and not all(attached):
+            self._release_exchange()
+        self.timers.add('pool_startup', timer() - start)
+        self._jobs = [deque() for _ in self.workers]
+
+    def _release_exchange(self):
+        self.exchange.close()
+        self.exchange.unlink()
+        self.exchange = None
+
+    def _call_all(self, command, args_list):
+        if any(self._jobs):
+            raise RuntimeError('Cannot call workers while submitted jobs are pending.')
+        start = timer()
+        for (_, conn), args in zip(self.workers, args_list):
+            conn.send((command, args))
+        replies = [conn.recv() for (_, conn), _ in zip(self.workers, args_list)]
+        self.timers.add('ipc', timer() - start - max(elapsed for _, elapsed in replies))
+        results = [result for result, _ in replies]
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+        return results
+
+    def update_positions(self, method, kwargs):
+        super().update_positions(method, kwargs)
+        self._call_all('update_positions', [(method, kwargs)] * len(self.workers))
+
+    def pop_timers(self):
+        if self.timers.enabled:
+            for state in self._call_all('pop_timers', [()] * len(self.workers)):
+                self.timers.merge(state)
+        return self.timers.pop()
+
+    def submit(self, genomes, tag, thresholds=None):
+        worker = min(range(len(self.workers)), key=lambda k: len(self._jobs[k]))
+        self.workers[worker][1].send(('_evaluate', (genomes, thresholds)))
+        self._jobs[worker].append(tag)
+
+    @property
+    def num_workers(self):
+        return len(self.workers)
+
+    def pending(self):
+        return len(self._done) + sum(len(jobs) for jobs in self._jobs)
+
+    def collect(self):
+        busy = {self.workers[k][1]: k for k in range(len(self.workers)) if self._jobs[k]}
+        if not self._done and busy:
+            for conn in wait(list(busy)):
+                result, _ = conn.recv()
+                tag = self._jobs[busy[conn]].popleft()
+                if isinstance(result, Exception):
+                    raise result
+                self._finish(tag, *result)
+        return super().collect()
+
+    def _evaluate(self, genomes, thresholds=None):
+        bounds = np.linspace(0, len(genomes), len(self.workers) + 1).astype(int)
+        if self.exchange is not None and len(genomes) <= self.capacity:
+            arrays, count = self.exchange.arrays, len(genomes)
+            arrays['genomes'][:count] = genomes
+            if thresholds is not None:
+                arrays['thresholds'][:count] = thresholds
+            times = self._call_all('evaluate_shared', [(start, stop, thresholds is not None)
+                                                       for start, stop in zip(bounds[:-1], bounds[1:])])
+            return (arrays['fitness'][:count].copy(), sum(times) / len(self.workers), arrays['work'][:count].copy(),
+                    arrays['bounded'][:count].copy())
+        results = self._call_all('_evaluate', [(genomes[start:stop], None if thresholds is None
+                                                else thresholds[start:stop])
+                                               for start, stop in zip(bounds[:-1], bounds[1:])])
+        fitness, times, work, bounded = zip(*results)
+        return np.concatenate(fitness), sum(times) / len(self.workers), np.concatenate(work), np.concatenate(bounded)
+
+    def close(self):
+        for process, conn in self.workers:
+            try:
+                conn.send(('close', ()))
+            except (BrokenPipeError, OSError):
+                pass
+            process.join()
+            conn.close()
+        self.workers = []
+        if self.exchange is not None:
+            self._release_exchange()
+        super().close()
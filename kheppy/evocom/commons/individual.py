@@ -2,15 +2,28 @@ from abc import ABC, abstractmethod
 import numpy as np
 from timeit import default_timer as timer
 
+from kheppy.utils.aggregation import RunningAggregator
+from kheppy.utils.fitfunc import is_trajectory
+from kheppy.utils.profiling import NULL_TIMERS
+
 
 class Controller(ABC):
 
-    def __init__(self, weights=None, biases=None, fitness=0):
-        self.weights = [np.array(layer_weights) for layer_weights in weights] if weights is not None else []
-        self.biases = [np.array(layer_biases) for layer_biases in biases] if biases is not None else []
+    def __init__(self, network, genome=None, fitness=0):
+        self.network = network
+        self.genome = (np.asarray(genome, network.dtype) if genome is not None
+                       else np.zeros(network.genome_len, network.dtype))
 
         self.fitness = fitness
 
+    @property
+    def weights(self):
+        return self.network.unpack(self.genome)[0]
+
+    @property
+    def biases(self):
+        return self.network.unpack(self.genome)[1]
+
     @abstractmethod
     def copy(self):
         pass
@@ -18,17 +31,88 @@ class Controller(ABC):
     def reset_fitness(self):
         self.fitness = 0
 
-    def evaluate(self, simulation, model, num_cycles, steps_per_cycle, max_speed, eval_func, aggregate_func):
-        fitness = []
-        time = 0
-        for i in range(num_cycles):
-            left, right = model.predict(simulation.get_sensor_states(), self.weights, self.biases)
-            simulation.set_robot_speed(left * max_speed, right * max_speed)
-            start = timer()
-            simulation.simulate(steps_per_cycle)
-            time += timer() - start
-            fitness.append(eval_func(simulation.get_sensor_states(), left, right))
+    def evaluate(self, simulation, model, num_cycles, steps_per_cycle, max_speed, eval_func, aggregate_func,
+                 recorder=None, episode=0):
+        """Run one episode in simulation and add its fitness to fitness of this controller.
 
-        fitness = aggregate_func(fitness)
+        :param recorder: optional kheppy.utils.recording.TrajectoryRecorder, which receives the episode under
+            number 'episode'
+        """
+        weights, biases = model.unpack(self.genome)
+        start = simulation.get_robot_position() if recorder is not None else None
+        fitness, time = run_episode(simulation, model, weights, biases, num_cycles, steps_per_cycle, max_speed,
+                                    eval_func, aggregate_func,
+                                    record=recorder.episode(episode) if recorder is not None else None)
+        if recorder is not None:
+            recorder.finish(episode, num_cycles, fitness, start)
         self.fitness += fitness
         return time
+
+
+def run_episode(simulation, model, weights, biases, num_cycles, steps_per_cycle, max_speed, eval_func,
+                aggregate_func, timers=NULL_TIMERS, monitor=None, episode=0, record=None):
+    """Let network with given weights and biases steer the robot in simulation for num_cycles cycles.
+
+    With a trajectory fitness function (see kheppy.utils.fitfunc.trajectory) sensors and motors are recorded and
+    scored once after the last cycle, monitor is not supported then. With a RunningAggregator scores are aggregated
+    in constant memory.
+
+    :param timers: kheppy.utils.profiling.Timers measuring time of episode phases
+    :param monitor: optional EpisodeMonitor receiving scores of this episode as given episode number,
+        the episode ends as soon as monitor stops it (see kheppy.evocom.commons.termination)
+    :param record: optional tuple of arrays (sensors, motors, positions) of shapes (num_cycles, sensor_count),
+        (num_cycles, 2) and (num_cycles, 2) receiving state of every cycle (see TrajectoryRecorder.episode)
+
+    :return: tuple (aggregated fitness, simulation time)
+    """
+    running = isinstance(aggregate_func, RunningAggregator)
+    trajectory = is_trajectory(eval_func)
+    fitness = aggregate_func.start() if running else []
+    time = 0
+    position = np.empty(2) if monitor is not None or record is not None else None
+    predict = model.compile().bind(weights, biases).predict
+    timers.lap()
+    sensors = simulation.read_sensors(np.empty(simulation.sensor_count))
+    if record is not None:
+        rec_sensors, rec_motors, rec_positions = record
+    if trajectory:
+        sensor_log, motor_log = np.empty((num_cycles, len(sensors))), np.empty((num_cycles, 2))
+    timers.lap('sensors')
+    for i in range(num_cycles):
+        left, right = predict(sensors)
+        timers.lap('inference')
+        simulation.set_robot_speed(left * max_speed, right * max_speed)
+        start = timer()
+        simulation.simulate(steps_per_cycle)
+        time += timer() - start
+        timers.lap('stepping')
+        simulation.read_sensors(sensors, position)
+        if record is not None:
+            rec_sensors[i] = sensors
+            rec_motors[i, 0] = left
+            rec_motors[i, 1] = right
+            rec_positions[i] = position
+        timers.lap('sensors')
+        if trajectory:
+            sensor_log[i] = sensors
+            motor_log[i] = left, right
+            continue
+        score = eval_func(sensors, left, right)
+        if running:
+            fitness = aggregate_func.update(fitness, i, score)
+        else:
+            fitness.append(score)
+        timers.lap('fitness')
+        if monitor is not None:
+            monitor.record_one(i, episode, score, sensors, position)
+            if not monitor.active[episode]:
+                return aggregate_func(monitor.scores[:, episode]), time
+
+    if trajectory:
+        fitness = aggregate_func(eval_func(sensor_log, motor_log))
+        timers.lap('fitness')
+    elif running:
+        fitness = aggregate_func.result(fitness, num_cycles)
+    else:
+        fitness = aggregate_func(fitness)
+    return fitness, time
@@ -0,0 +1,168 @@
+import multiprocessing
+from multiprocessing.connection import wait
+
+import numpy as np
+
+from kheppy.utils import Reporter
+
+TOPOLOGIES = ('ring', 'full')
+
+
+class _Migration:
+    """Exchanges emigrants with IslandModel every 'interval' epochs, called by BaseAlgorithm.run after each epoch."""
+
+    def __init__(self, conn, interval, num_migrants):
+        self.conn = conn
+        self.interval = interval
+        self.num_migrants = num_migrants
+
+    def __call__(self, algorithm, epoch, pop):
+        """Send emigrants, receive and evaluate immigrants; return number of FFE spent on immigrants."""
+        if epoch % self.interval:
+            return 0
+        self.conn.send(('migrate', (epoch // self.interval, pop.emigrants(self.num_migrants))))
+        genomes = self.conn.recv()
+        if not len(genomes):
+            return 0
+        evaluator = algorithm._evaluator
+        evaluations = evaluator.evaluations
+        fitness, _ = evaluator.evaluate(genomes)
+        pop.immigrate(genomes, fitness)
+        return algorithm._ffe(evaluator.evaluations - evaluations)
+
+
+def _island_loop(conn, algorithm, interval, num_migrants, num_proc, seed):
+    algorithm._migration = _Migration(conn, interval, num_migrants)
+    try:
+        algorithm.run(num_proc=num_proc, seed=seed)
+        conn.send(('done', (algorithm.best, algorithm.reporter.entries)))
+    except Exception as e:
+        conn.send(('error', e))
+    conn.close()
+
+
+class IslandModel:
+    """
+    Island model: independent populations of one algorithm evolved in separate processes, exchanging their best
+    individuals every 'migration_interval' epochs.
+
+    Every island is a copy of 'algorithm' (GA, DE or PSO with all parameters set) with its own evaluator, run with
+    its own seed. Emigrants of an island are its 'num_migrants' best individuals. With 'ring' topology island k
+    receives emigrants of island k - 1, with 'full' topology the 'num_migrants' best of emigrants of all other
+    islands (by fitness in their own islands). Immigrants are evaluated in the worlds of the receiving island (their
+    FFE are counted) and replace its worst individuals.
+    Islands wait for each other only at migrations.
+
+    After run, 'reporters' holds Reporter of every island and 'reporter' their aggregate per epoch: maximum of
+    'max', mean of 'avg', minimum of 'min' over islands still running, and total 'ffe' of all islands.
+    """
+
+    def __init__(self, algorithm, num_islands=4, migration_interval=5, num_migrants=2, topology='ring'):
+        if topology not in TOPOLOGIES:
+            raise ValueError('Unsupported topology {}. Use one of: {}.'.format(topology, ', '.join(TOPOLOGIES)))
+        # every island receives at most num_migrants immigrants, evaluated at once
+        if num_migrants >= algorithm.params['pop_size']:
+            raise ValueError('Number of migrants has to be smaller than population size.')
+        if num_migrants > algorithm._sim_demand():
+            raise ValueError('Number of migrants cannot exceed number of controllers evaluated at once ({}).'
+                             .format(algorithm._sim_demand()))
+        self.algorithm = algorithm
+        self.num_islands = num_islands
+        self.migration_interval = migration_interval
+        self.num_migrants = num_migrants
+        self.topology = topology
+        self.reporters = []
+        self.reporter = Reporter(['max', 'avg', 'min', 'ffe'])
+        self.best = None
+
+    def _sources(self, island, senders):
+        if self.topology == 'ring':
+            source = (island - 1) % self.num_islands
+            return [source] if source in senders else []
+        return [source for source in senders if source != island]
+
+    def run(self, seed=42, num_proc=1, verbose=False):
+        """Run evolution on all islands.
+
+        :param seed: random seed, seeds of islands are drawn from it
+        :param num_proc: number of evaluation processes of every island
+        :param verbose: print best fitness of every island at each migration
+        """
+        self.best = None
+        seeds = np.random.RandomState(seed).randint(2 ** 31, size=self.num_islands)
+        islands = []
+        running, results, emigrants = set(range(self.num_islands)), {}, {}
+        try:
+            # not daemonic, islands start their own evaluation processes
+            for k in range(self.num_islands):
+                conn, child_conn = multiprocessing.Pipe()
+                process = multiprocessing.Process(target=_island_loop,
+                                                  args=(child_conn, self.algorithm, self.migration_interval,
+                                                        self.num_migrants, num_proc, int(seeds[k])))
+                islands.append((process, conn))
+                process.start()
+                child_conn.close()
+
+            conns = {conn: k for k, (_, conn) in enumerate(islands)}
+            while running:
+                for conn in wait([islands[k][1] for k in running]):
+                    k = conns[conn]
+                    message, content = conn.recv()
+                    if message == 'error':
+                        raise content
+                    if message == 'done':
+                        results[k] = content
+                        running.discard(k)
+                    else:
+                        emigrants[k] = content
+                if running and running <= set(emigrants):
+                    self._migrate(islands, emigrants, verbose)
+                    emigrants = {}
+        except BaseException:
+            for process, _ in islands:
+                if process.is_alive():
+                    process.terminate()
+            raise
+        finally:
+            for process, conn in islands:
+                if process.pid is not None:
+                    process.join()
+                conn.close()
+
+        self.reporters = []
+        for k in range(self.num_islands):
+            best, entries = results[k]
+            reporter = Reporter(list(entries))
+            reporter.entries = entries
+            self.reporters.append(reporter)
+            if self.best is None or best.fitness > self.best.fitness:
+                self.best = best
+        self._aggregate()
+        self.algorithm.best = self.best
+
+    def _migrate(self, islands, emigrants, verbose):
+        senders = sorted(emigrants)
+        if verbose:
+            print('Migration {:>3} | best fitness of islands: {}'.format(
+                emigrants[senders[0]][0], ' '.join('{:.4f}'.format(emigrants[k][1][1][0]) for k in senders)))
+        model = self.algorithm.params['model']
+        for k in senders:
+            sources = self._sources(k, senders)
+            genomes = np.empty((0, model.genome_len), model.dtype)
+            if sources:
+                genomes = np.concatenate([emigrants[source][1][0] for source in sources])
+                fitness = np.concatenate([emigrants[source][1][1] for source in sources])
+                genomes = genomes[np.argsort(-fitness, kind='stable')[:self.num_migrants]]
+            islands[k][1].send(genomes)
+
+    def _aggregate(self):
+        # last series of every island
+        entries = [{name: series[-1] for name, series in reporter.entries.items()} for reporter in self.reporters]
+        num_epochs = max(len(island['max']) for island in entries)
+        for i in range(num_epochs):
+            present = [island for island in entries if len(island['max']) > i]
+            ffe = sum(island['ffe'][min(i, len(island['ffe']) - 1)] for island in entries if island['ffe'])
+            self.reporter.put(['max', 'avg', 'min', 'ffe'],
+                              [max(island['max'][i] for island in present),
+                               np.mean([island['avg'][i] for island in present]),
+                               min(island['min'][i] for island in present), ffe])
@@ -1,3 +1,5 @@
+from functools import partial
+import struct
 import numpy as np
 from numpy.random import uniform
 
@@ -16,12 +18,68 @@ def _linear(x):
     return x
 
 
+def _sigmoid_(x):
+    np.negative(x, out=x)
+    np.exp(x, out=x)
+    x += 1
+    np.reciprocal(x, out=x)
+
+
+def _in_place_activation(name, x):
+    """Return function of no arguments applying activation to buffer x in place, None for linear activation."""
+    if name == 'relu':
+        # comparing with a zero array is faster than with scalar 0
+        return partial(np.maximum, x, np.zeros_like(x), out=x)
+    if name == 'tanh':
+        return partial(np.tanh, x, out=x)
+    if name == 'sigmoid':
+        return partial(_sigmoid_, x)
+    return None
+
+
 class Layer:
-    def __init__(self, w_shape, b_shape, activation, activation_name):
+    def __init__(self, w_shape, b_shape, activation, activation_name, offset=0):
         self.W = w_shape
         self.b = b_shape
         self.activation = activation
         self.activation_name = activation_name
+        self.w_start = offset
+        self.b_start = offset + w_shape[0] * w_shape[1]
+        self.end = self.b_start + b_shape[0] * b_shape[1]
+
+
+class CompiledNet:
+    """
+    Forward pass of a NeuralNet for single samples, frozen into a plan of preallocated (1, n) layer buffers,
+    np.dot with 'out' and in-place activations, so that predict allocates no arrays.
+
+    Weights and biases of a controller are bound once (bind), then predict is called for every sample. Results are
+    identical to NeuralNet.predict. Returned array is the output buffer, overwritten by the next call.
+    """
+
+    def __init__(self, network):
+        self.input = np.empty((1, network.input_len), network.dtype)
+        self.steps = []
+        for layer in network.layers:
+            out = np.empty((1, layer.W[1]), network.dtype)
+            self.steps.append((out, _in_place_activation(layer.activation_name, out)))
+        self.params = []
+
+    def bind(self, weights_by_layer, biases_by_layer):
+        self.params = list(zip(weights_by_layer, biases_by_layer))
+        return self
+
+    def predict(self, inputs):
+        """Return network output for 1-D input of length input_len."""
+        self.input[0] = inputs
+        x, add = self.input, np.add
+        for (weights, biases), (out, activation) in zip(self.params, self.steps):
+            x.dot(weights, out)
+            add(out, biases, out)
+            if activation is not None:
+                activation()
+            x = out
+        return x[0]
 
 
 class NeuralNet:
@@ -32,28 +90,99 @@ class NeuralNet:
         'linear': _linear,
     }
 
-    def __init__(self, input_len):
+    def __init__(self, input_len, dtype=np.float64):
+        """
+        :param input_len: number of inputs (robot sensors)
+        :param dtype: floating point type of genomes, weights and inference, e.g. np.float32 to halve memory and
+            transfer volume of populations; sensor states are cast to it before inference
+        """
         self.layers = []
+        self.dtype = np.dtype(dtype)
+        self.input_len = input_len
         self.output_len = input_len
+        self.genome_len = 0
+        self._compiled = None
+
+    def __getstate__(self):
+        # buffers of a compiled plan are process-local, the copy compiles its own
+        state = self.__dict__.copy()
+        state['_compiled'] = None
+        return state
+
+    def compile(self):
+        """Return CompiledNet of the current layers, built once and reused by later calls."""
+        if getattr(self, '_compiled', None) is None or len(self._compiled.steps) != len(self.layers):
+            self._compiled = CompiledNet(self)
+        return self._compiled
 
     def add_layer(self, output_len, activation):
-        layer = Layer((self.output_len, output_len), (1, output_len), NeuralNet.ACTIVATIONS[activation], activation)
+        layer = Layer((self.output_len, output_len), (1, output_len), NeuralNet.ACTIVATIONS[activation], activation,
+                      self.genome_len)
         self.layers.append(layer)
         self.output_len = output_len
+        self.genome_len = layer.end
         return self
 
+    def segments(self):
+        """Return (start, stop) genome bounds of every weight matrix and bias vector, in genome order."""
+        bounds = []
+        for layer in self.layers:
+            bounds.append((layer.w_start, layer.b_start))
+            bounds.append((layer.b_start, layer.end))
+        return bounds
+
+    def unpack(self, genome):
+        """Split genome into per-layer weights and biases.
+
+        Genome is laid out as [W_1, b_1, W_2, b_2, ...], each matrix flattened in C order. Returned arrays are views,
+        so writing to them modifies the genome. Genome can also be a (pop_size, genome_len) matrix, in which case
+        stacked (pop_size, *W.shape) and (pop_size, *b.shape) views are returned.
+
+        :param genome: array of shape (..., genome_len)
+
+        :return: tuple (weights_by_layer, biases_by_layer)
+        """
+        lead = genome.shape[:-1]
+        weights = [genome[..., layer.w_start:layer.b_start].reshape(lead + layer.W) for layer in self.layers]
+        biases = [genome[..., layer.b_start:layer.end].reshape(lead + layer.b) for layer in self.layers]
+        return weights, biases
+
+    def pack(self, weights_by_layer, biases_by_layer):
+        genome = np.empty(self.genome_len, self.dtype)
+        for layer, weights, biases in zip(self.layers, weights_by_layer, biases_by_layer):
+            genome[layer.w_start:layer.b_start] = np.ravel(weights)
+            genome[layer.b_start:layer.end] = np.ravel(biases)
+        return genome
+
     def predict(self, inputs, weights_by_layer, biases_by_layer):
-        inputs = np.asarray([inputs])
+        inputs = np.asarray([inputs], self.dtype)
         for layer, weights, biases in zip(self.layers, weights_by_layer, biases_by_layer):
             inputs = layer.activation(inputs.dot(weights) + biases)
         return inputs[0]
 
+    def predict_batch(self, inputs, weights_by_layer, biases_by_layer):
+        """Run forward pass for many controllers at once.
+
+        :param inputs: array of shape (num_controllers, num_samples, input_len)
+        :param weights_by_layer: stacked weights, as returned by unpack for a genome matrix
+        :param biases_by_layer: stacked biases, as returned by unpack for a genome matrix
+
+        :return: array of shape (num_controllers, num_samples, output_len)
+        """
+        inputs = np.asarray(inputs, self.dtype)
+        for layer, weights, biases in zip(self.layers, weights_by_layer, biases_by_layer):
+            inputs = layer.activation(np.matmul(inputs, weights) + biases)
+        return inputs
+
+    def random_genomes(self, num_genomes, init_limits):
+        return uniform(init_limits[0], init_limits[1], (num_genomes, self.genome_len)).astype(self.dtype, copy=False)
+
     def random_matrix(self, func, init_limits):
         weights = []
         for layer in self.layers:
             shape = func(layer)
             inits = uniform(init_limits[0], init_limits[1], shape)
-            weights.append(inits)
+            weights.append(inits.astype(self.dtype, copy=False))
 
         return weights
 
@@ -63,7 +192,21 @@ class NeuralNet:
     def random_biases_list(self, init_limits):
         return self.random_matrix(lambda layer: layer.b, init_limits)
 
+    def save_binary(self, path, genome):
+        """Save network with given genome in binary format, see ModelArchive. Load it with NeuralNet.load."""
+        ModelArchive.write(path, self, np.reshape(genome, (1, -1)))
+
+    @staticmethod
+    def load(path):
+        """Load network and genome saved with save_binary (or first model of a ModelArchive file).
+
+        :return: tuple (NeuralNet, genome)
+        """
+        archive = ModelArchive(path)
+        return archive.network, np.array(archive[0])
+
     def save(self, path, weights, biases):
+        """Save network in text format used by the simulation engine."""
         with open(path, 'w') as f:
             f.write(str(len(self.layers)) + '\n')
             for layer, w, b in zip(self.layers, weights, biases):
@@ -74,3 +217,90 @@ class NeuralNet:
                     f.write(to_str(w_row) + '\n')
                 f.write(to_str(b.shape) + '\n')
                 f.write(to_str(b) + '\n')
+
+
+class ModelArchive:
+    """
+    Binary container of many genomes sharing one network architecture.
+
+    File layout (all numbers little-endian):
+        header  - magic b'KHNN', format version (uint8), number of models (uint32), network input length (uint32),
+                  number of layers (uint16), fitness flag (uint8), genome dtype string (length-prefixed),
+                  then output length (uint32) and activation name (length-prefixed) of every layer,
+                  zero-padded to a multiple of 16 bytes,
+        genomes - raw (num_models, genome_len) array,
+        fitness - raw (num_models,) float64 array, only if fitness flag is set.
+
+    Genomes (and fitness) are memory-mapped, so opening an archive is cheap and models are read from disk
+    only when accessed.
+    """
+    MAGIC = b'KHNN'
+    VERSION = 1
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.network, count, dtype, has_fitness = ModelArchive._read_header(f)
+            offset = f.tell()
+
+        shape = (count, self.network.genome_len)
+        self.genomes = np.memmap(path, dtype, 'r', offset, shape) if count else np.empty(shape, dtype)
+        self.fitness = None
+        if has_fitness:
+            fitness_offset = offset + self.genomes.nbytes
+            self.fitness = np.memmap(path, '<f8', 'r', fitness_offset, (count,)) if count else np.empty(0)
+
+    @staticmethod
+    def write(path, network, genomes, fitness=None):
+        """Write archive.
+
+        :param path: output file path
+        :param network: NeuralNet shared by all models
+        :param genomes: genome matrix of shape (num_models, genome_len)
+        :param fitness: optional array of shape (num_models,)
+        """
+        genomes = np.asarray(genomes)
+        if genomes.ndim != 2 or genomes.shape[1] != network.genome_len:
+            raise ValueError('Genome matrix shape {} does not match network genome length {}.'
+                             .format(genomes.shape, network.genome_len))
+        dtype = genomes.dtype.newbyteorder('<')
+        with open(path, 'wb') as f:
+            ModelArchive._write_header(f, network, len(genomes), dtype, fitness is not None)
+            f.write(np.ascontiguousarray(genomes, dtype).tobytes())
+            if fitness is not None:
+                f.write(np.ascontiguousarray(fitness, '<f8').tobytes())
+
+    @staticmethod
+    def _write_header(f, network, count, dtype, has_fitness):
+        dtype_str = dtype.str.encode()
+        f.write(struct.pack('<4sBIIHB', ModelArchive.MAGIC, ModelArchive.VERSION, count, network.input_len,
+                            len(network.layers), has_fitness))
+        f.write(struct.pack('<B', len(dtype_str)) + dtype_str)
+        for layer in network.layers:
+            name = layer.activation_name.encode()
+            f.write(struct.pack('<IB', layer.W[1], len(name)) + name)
+        f.write(b'\0' * (-f.tell() % 16))
+
+    @staticmethod
+    def _read_header(f):
+        def read(fmt):
+            return struct.unpack(fmt, f.read(struct.calcsize(fmt)))
+
+        magic, version, count, input_len, num_layers, has_fitness = read('<4sBIIHB')
+        if magic != ModelArchive.MAGIC:
+            raise ValueError('Not a KhepPy model file.')
+        if version != ModelArchive.VERSION:
+            raise ValueError('Unsupported model file version {}.'.format(version))
+        dtype = np.dtype(f.read(read('<B')[0]).decode())
+
+        network = NeuralNet(input_len, dtype.newbyteorder('='))
+        for _ in range(num_layers):
+            output_len, name_len = read('<IB')
+            network.add_layer(output_len, f.read(name_len).decode())
+        f.seek(-f.tell() % 16, 1)
+        return network, count, dtype, bool(has_fitness)
+
+    def __getitem__(self, item):
+        return self.genomes[item]
+
+    def __len__(self):
+        return len(self.genomes)
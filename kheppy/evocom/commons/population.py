@@ -1,64 +1,95 @@
-from abc import ABC, abstractmethod
-from multiprocessing.pool import Pool
+from abc import ABC
 import numpy as np
 
-_PARALLEL_CONTEXT = None
 
+class Population(ABC):
+    """
+    Population of controllers stored as a single (pop_size, genome_len) genome matrix with matching fitness vector.
 
-def evaluate_controller(elem):
-    time = 0
-    controller, sims = _PARALLEL_CONTEXT[6][elem]
-    controller.reset_fitness()
-    for sim in sims:
-        time += controller.evaluate(sim, _PARALLEL_CONTEXT[0], _PARALLEL_CONTEXT[1], _PARALLEL_CONTEXT[2],
-                                    _PARALLEL_CONTEXT[3], _PARALLEL_CONTEXT[4], _PARALLEL_CONTEXT[5])
-    controller.fitness /= len(sims)
-    return time, elem, controller.fitness
-
+    Controller objects are created on demand (see Population.controller) and hold views into the genome matrix,
+    so variation operators can work on the whole population at once.
 
-class Population(ABC):
+    Individuals whose evaluation was stopped early hold an upper bound of fitness (marked in 'bounded'), they are
+    left out of worst and average_fitness.
+    """
+    controller_type = None
 
-    def __init__(self, network, pop_list):
+    def __init__(self, network, pop_list, fitness=None):
         self.network = network
 
         if isinstance(pop_list, int):
-            self.pop = [None] * pop_list
+            self.genomes = np.zeros((pop_list, network.genome_len), network.dtype)
         else:
-            self.pop = list(pop_list)
-        self.pop_size = len(self.pop)
+            self.genomes = np.asarray(pop_list, network.dtype)
+        self.fitness = np.zeros(len(self.genomes)) if fitness is None else np.asarray(fitness, dtype=float)
+        self.pop_size = len(self.genomes)
+        self.bounded = np.zeros(self.pop_size, dtype=bool)
 
-    @abstractmethod
     def initialize(self, init_limits):
-        pass
+        self.genomes = self.network.random_genomes(self.pop_size, init_limits)
+        self.fitness = np.zeros(self.pop_size)
+        self.bounded = np.zeros(self.pop_size, dtype=bool)
+        return self
 
-    def evaluate(self, sim_list, num_cycles, steps_per_cycle, max_speed, eval_func, aggregate_func, num_proc):
-        total_sim_time = 0
-        global _PARALLEL_CONTEXT
-        _PARALLEL_CONTEXT = (self.network, num_cycles, steps_per_cycle, max_speed, eval_func, aggregate_func,
-                             list(zip(self.pop, sim_list[:len(self.pop)])))
+    def controller(self, index):
+        return self.controller_type(self.network, self.genomes[index], self.fitness[index])
 
-        if num_proc == 1:
-            results = [evaluate_controller(i) for i in range(len(self.pop))]
-        else:
-            pool = Pool(processes=num_proc)
-            results = pool.map(evaluate_controller, range(len(self.pop)),
-                               chunksize=max(1, int(len(self.pop) / num_proc)))
-            pool.close()
-            pool.join()
+    @property
+    def pop(self):
+        return [self.controller(i) for i in range(len(self))]
+
+    def evaluate(self, evaluator, thresholds=None):
+        """Evaluate all genomes with given Evaluator and store their fitness.
+
+        :param thresholds: optional fitness values each genome has to beat to matter, see Evaluator.evaluate
 
-        for sim_time, ind, fitness in results:
-            self.pop[ind].fitness = fitness
-            total_sim_time += sim_time
+        :return: simulation time
+        """
+        self.fitness, time = evaluator.evaluate(self.genomes, thresholds)
+        self.bounded = evaluator.bounded
+        return time
 
-        return total_sim_time / num_proc
+    def get_state(self):
+        """Return dictionary of arrays describing population, see set_state."""
+        return {'genomes': self.genomes, 'fitness': self.fitness}
+
+    def set_state(self, state):
+        self.genomes = np.asarray(state['genomes'], self.network.dtype)
+        self.fitness = state['fitness']
+        self.bounded = np.zeros(len(self.genomes), dtype=bool)
+        return self
+
+    def emigrants(self, count):
+        """Return tuple (genomes, fitness) with copies of 'count' best individuals, best first."""
+        order = np.argsort(-self.fitness, kind='stable')[:count]
+        return self.genomes[order].copy(), self.fitness[order].copy()
+
+    def immigrate(self, genomes, fitness):
+        """Replace the worst individuals with the best of given evaluated genomes.
+
+        :return: indices of replaced individuals
+        """
+        count = min(len(genomes), len(self))
+        replaced = np.argsort(self.fitness, kind='stable')[:count]
+        order = np.argsort(-np.asarray(fitness), kind='stable')[:count]
+        self.genomes[replaced] = genomes[order]
+        self.fitness[replaced] = fitness[order]
+        self.bounded[replaced] = False
+        return replaced
 
     def best(self):
-        max_ind = np.argmax([controller.fitness for controller in self.pop])
-        return self.pop[max_ind]
+        return self.controller(np.argmax(self.fitness))
+
+    def _scored(self):
+        scored = np.flatnonzero(~self.bounded)
+        return scored if len(scored) else np.arange(len(self))
 
     def worst(self):
-        min_ind = np.argmin([controller.fitness for controller in self.pop])
-        return self.pop[min_ind]
+        scored = self._scored()
+        return self.controller(scored[np.argmin(self.fitness[scored])])
 
     def average_fitness(self):
-        return np.mean([controller.fitness for controller in self.pop])
+        return np.mean(self.fitness[self._scored()])
+
+    def __len__(self):
+        return len(self.genomes)
@@ -0,0 +1,285 @@
+"""
+Evaluation on worker processes connected over TCP, possibly running on other machines.
+
+Coordinator (RemotePool, created by BaseAlgorithm when remote_params were set) listens at an address and workers
+connect to it, at any time during evolution:
+    python -m kheppy.evocom.commons.remote coordinator-host:6000 --authkey secret
+
+Workers need kheppy, the world file under the same path and the fitness and aggregation functions importable
+under the same names as on the coordinator, and KHEPERA_LIB for the native backend.
+"""
+import argparse
+import itertools
+import os
+import queue
+import socket
+import threading
+from collections import deque
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener, wait
+from time import sleep
+from timeit import default_timer as timer
+
+import numpy as np
+
+from kheppy.evocom.commons.evaluation import Evaluator
+from kheppy.utils.profiling import Timers, NULL_TIMERS
+
+
+class RemotePool(Evaluator):
+    """
+    Evaluates genome matrices on remote workers (see serve).
+
+    Genome matrices are split into jobs of at most 'chunk_size' genomes, sent to idle workers. A worker receives
+    evaluation parameters once, when it connects, and every job carries the starting position updates the worker
+    has not applied yet, so workers connecting late hold the same worlds as the others and results do not depend
+    on which worker evaluated a job. Jobs of a worker whose connection is lost, or which does not reply within
+    'job_timeout' seconds, are given to other workers.
+
+    :param address: (host, port) to listen at, port 0 picks a free port (see 'address' attribute)
+    :param authkey: bytes shared with workers
+    :param wait_timeout: seconds to wait for a worker when none is connected before RuntimeError is raised,
+        None waits forever
+    """
+
+    poll_interval = 0.5
+
+    def __init__(self, params, capacity, address, authkey, chunk_size=10, job_timeout=None, wait_timeout=None,
+                 timers=NULL_TIMERS):
+        super().__init__(params, 0, timers)
+        self.chunk_size = max(1, min(chunk_size, capacity))
+        self.job_timeout = job_timeout
+        self.wait_timeout = wait_timeout
+        self.listener = Listener(address, authkey=authkey)
+        self.address = self.listener.address
+        self.updates = []
+        self.workers = {}
+        self.dropped = 0
+        self._idle = deque()
+        self._busy = {}
+        self._queue = deque()
+        self._results = {}
+        self._tags = {}
+        self._job_ids = itertools.count()
+        self._closed = False
+        self._new_workers = queue.Queue()
+        self._acceptor = threading.Thread(target=self._accept, daemon=True)
+        self._acceptor.start()
+
+    def _accept(self):
+        while not self._closed:
+            try:
+                conn = self.listener.accept()
+            except (OSError, EOFError, AuthenticationError):
+                continue
+            if self._closed:
+                conn.close()
+            else:
+                self._new_workers.put(conn)
+
+    def _add_workers(self, block=False):
+        try:
+            while True:
+                conn = self._new_workers.get(block, self.wait_timeout)
+                block = False
+                if self._send(conn, ('init', (self.params, self.chunk_size, self.timers.enabled))):
+                    self.workers[conn] = 0
+                    self._busy[conn] = (None, timer())
+        except queue.Empty:
+            if block:
+                raise RuntimeError('No evaluation worker connected to {} within {}s.'
+                                   .format(self.address, self.wait_timeout))
+
+    def _send(self, conn, message):
+        try:
+            conn.send(message)
+            return True
+        except (OSError, EOFError):
+            conn.close()
+            return False
+
+    def _drop(self, conn):
+        """Forget worker and put its job back at the front of the queue."""
+        job, _ = self._busy.pop(conn, (None, 0))
+        if job is not None:
+            self._queue.appendleft(job)
+        if conn in self._idle:
+            self._idle.remove(conn)
+        del self.workers[conn]
+        self.dropped += 1
+        conn.close()
+
+    def _dispatch(self):
+        while self._queue and self._idle:
+            conn = self._idle.popleft()
+            job = self._queue.popleft()
+            job_id, genomes, thresholds = job
+            if self._send(conn, ('evaluate', (self.updates[self.workers[conn]:], genomes, thresholds))):
+                self.workers[conn] = len(self.updates)
+                self._busy[conn] = (job, timer())
+            else:
+                self._queue.appendleft(job)
+                self._drop(conn)
+
+    def _receive(self, conn):
+        try:
+            result, timers_state, _ = conn.recv()
+        except (OSError, EOFError):
+            self._drop(conn)
+            return
+        job, _ = self._busy.pop(conn)
+        self._idle.append(conn)
+        if isinstance(result, Exception):
+            raise result
+        self.timers.merge(timers_state)
+        if job is None:
+            return
+        job_id = job[0]
+        if job_id in self._tags:
+            self._finish(self._tags.pop(job_id), *result)
+        else:
+            self._results[job_id] = result
+
+    def _poll(self):
+        """Hand out queued jobs and process replies which arrive within poll_interval."""
+        self._add_workers(block=not self.workers)
+        self._dispatch()
+        for conn in wait(list(self._busy), self.poll_interval):
+            self._receive(conn)
+        if self.job_timeout is not None:
+            now = timer()
+            for conn, (job, start) in list(self._busy.items()):
+                if now - start > self.job_timeout:
+                    self._drop(conn)
+
+    def _enqueue(self, genomes, thresholds):
+        job_id = next(self._job_ids)
+        self._queue.append((job_id, genomes, thresholds))
+        return job_id
+
+    def update_positions(self, method, kwargs):
+        super().update_positions(method, kwargs)
+        self.updates.append((method, kwargs))
+
+    def submit(self, genomes, tag, thresholds=None):
+        if len(genomes) > self.chunk_size:
+            raise ValueError('Cannot submit more than {} genomes at once.'.format(self.chunk_size))
+        self._tags[self._enqueue(genomes, thresholds)] = tag
+        self._dispatch()
+
+    @property
+    def num_workers(self):
+        # workers connect and leave during the run
+        return max(len(self.workers), 1)
+
+    def pending(self):
+        return len(self._done) + len(self._tags)
+
+    def collect(self):
+        while not self._done and self._tags:
+            self._poll()
+        return super().collect()
+
+    def _evaluate(self, genomes, thresholds=None):
+        job_ids = [self._enqueue(genomes[start:start + self.chunk_size],
+                                 None if thresholds is None else thresholds[start:start + self.chunk_size])
+                   for start in range(0, len(genomes), self.chunk_size)]
+        while any(job_id not in self._results for job_id in job_ids):
+            self._poll()
+        fitness, times, work, bounded = zip(*[self._results.pop(job_id) for job_id in job_ids])
+        return (np.concatenate(fitness), sum(times) / max(len(self.workers), 1), np.concatenate(work),
+                np.concatenate(bounded))
+
+    def close(self):
+        self._closed = True
+        try:
+            # wake up the thread blocked in accept
+            socket.create_connection(self.address, timeout=1).close()
+        except OSError:
+            pass
+        self._acceptor.join()
+        self.listener.close()
+        for conn in list(self.workers):
+            self._send(conn, ('close', ()))
+            conn.close()
+        while not self._new_workers.empty():
+            self._new_workers.get().close()
+        self.workers = {}
+        super().close()
+
+
+def _serve_connection(conn):
+    """Evaluate jobs received from conn, return True if coordinator closed the connection on purpose."""
+    evaluator = None
+    try:
+        while True:
+            command, args = conn.recv()
+            if command == 'close':
+                return True
+            start = timer()
+            try:
+                if command == 'init':
+                    params, capacity, profile = args
+                    evaluator = Evaluator(params, capacity, Timers() if profile else NULL_TIMERS)
+                    result = None
+                else:
+                    updates, genomes, thresholds = args
+                    for method, kwargs in updates:
+                        evaluator.update_positions(method, kwargs)
+                    result = evaluator._evaluate(genomes, thresholds)
+            except Exception as e:
+                result = e
+            conn.send((result, evaluator.pop_timers() if evaluator is not None else None, timer() - start))
+    finally:
+        if evaluator is not None:
+            evaluator.close()
+
+
+def serve(address, authkey, persistent=False, retry_interval=1., max_retries=None):
+    """Connect to RemotePool listening at address and evaluate its jobs.
+
+    Lost connections are re-established, every new connection starts with a fresh evaluator.
+
+    :param persistent: keep serving (e.g. subsequent runs) after coordinator closes the connection
+    :param retry_interval: seconds between connection attempts
+    :param max_retries: number of consecutive failed connection attempts after which the function returns,
+        None retries forever
+    """
+    failures = 0
+    while True:
+        try:
+            conn = Client(address, authkey=authkey)
+        except (OSError, EOFError):
+            failures += 1
+            if max_retries is not None and failures > max_retries:
+                return
+            sleep(retry_interval)
+            continue
+        failures = 0
+        try:
+            closed = _serve_connection(conn)
+        except (OSError, EOFError):
+            closed = False
+        finally:
+            conn.close()
+        if closed and not persistent:
+            return
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Evaluation worker of kheppy.evocom.commons.remote.RemotePool.')
+    parser.add_argument('address', help='host:port of the coordinator')
+    parser.add_argument('--authkey', default=os.environ.get('KHEPPY_AUTHKEY'),
+                        help='shared secret, KHEPPY_AUTHKEY environment variable by default')
+    parser.add_argument('--persistent', action='store_true', help='keep serving after the coordinator finishes')
+    parser.add_argument('--retry-interval', type=float, default=1.)
+    parser.add_argument('--max-retries', type=int, default=None)
+    args = parser.parse_args()
+    if args.authkey is None:
+        parser.error('authkey is required')
+    host, port = args.address.rsplit(':', 1)
+    serve((host, int(port)), args.authkey.encode(), args.persistent, args.retry_interval, args.max_retries)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+import numpy as np
+
+from kheppy.utils.aggregation import RunningAggregator
+
+
+class EpisodeMonitor:
+    """
+    Collects per-cycle scores of episodes run together and stops episodes whose outcome is already known.
+
+    Episodes are numbered 0..num_ctrl * num_per_ctrl - 1, consecutive num_per_ctrl episodes belong to one
+    controller, whose fitness is the mean of aggregated scores of its episodes. Two optional rules are applied:
+
+    - stagnation: when sensor states and robot position have not changed for stagnation_window cycles,
+      the robot is stuck (e.g. pushing a wall) and will repeat its last move forever, so the score of the last
+      cycle is used for all remaining cycles,
+    - bound: with aggregation by mean and per-cycle score never above max_cycle_fitness, a controller whose
+      fitness cannot reach its threshold any more is stopped and scored with the upper bound of its fitness,
+      which is still below the threshold. The bound is checked after every cycle of all active episodes of
+      a controller (see record), so episodes of controllers with thresholds have to be simulated together.
+
+    Attribute 'simulated' holds number of cycles actually simulated in every episode. Matrix of all scores
+    ('scores', num_cycles x num_episodes) is allocated when the first scores are recorded.
+    """
+
+    def __init__(self, num_ctrl, num_per_ctrl, num_cycles, stagnation_window=0, max_cycle_fitness=None,
+                 thresholds=None):
+        num_episodes = num_ctrl * num_per_ctrl
+        self.shape = (num_ctrl, num_per_ctrl)
+        self.num_cycles = num_cycles
+        self.stagnation_window = stagnation_window
+        self.max_cycle_fitness = max_cycle_fitness
+        self.thresholds = None
+        if max_cycle_fitness is not None and thresholds is not None:
+            self.thresholds = np.asarray(thresholds, dtype=float)
+
+        self.scores = None
+        self.sums = np.zeros(num_episodes)
+        self.known = np.zeros(num_episodes, dtype=int)
+        self.simulated = np.zeros(num_episodes, dtype=int)
+        self.active = np.ones(num_episodes, dtype=bool)
+        self.bounded = np.zeros(num_ctrl, dtype=bool)
+        self.bounds = np.zeros(num_ctrl)
+        self.still = np.zeros(num_episodes, dtype=int)
+        self.sensors = None
+        self.positions = None
+
+    @property
+    def enabled(self):
+        return self.stagnation_window > 0 or self.thresholds is not None
+
+    def active_episodes(self):
+        return np.flatnonzero(self.active)
+
+    def record(self, cycle, episodes, scores, sensors=None, positions=None):
+        """Store scores of given episodes in cycle and stop episodes according to the rules.
+
+        :param episodes: indices of episodes simulated in this cycle
+        :param scores: scores of these episodes
+        :param sensors: sensor states after the cycle, shape (len(episodes), sensor_count), used by stagnation rule
+        :param positions: robot positions after the cycle, shape (len(episodes), 2), used by stagnation rule
+        """
+        self._allocate_scores()
+        self.scores[cycle, episodes] = scores
+        self.sums[episodes] += scores
+        self.known[episodes] = cycle + 1
+        self.simulated[episodes] = cycle + 1
+
+        if self.stagnation_window > 0:
+            if self.sensors is None:
+                self.sensors = np.full((len(self.active), sensors.shape[1]), np.nan)
+                self.positions = np.full((len(self.active), 2), np.nan)
+            same = np.all(self.sensors[episodes] == sensors, axis=1) & np.all(self.positions[episodes] == positions,
+                                                                              axis=1)
+            self.still[episodes] = np.where(same, self.still[episodes] + 1, 0)
+            self.sensors[episodes] = sensors
+            self.positions[episodes] = positions
+            for episode in episodes[self.still[episodes] >= self.stagnation_window]:
+                self.scores[cycle + 1:, episode] = self.scores[cycle, episode]
+                self.sums[episode] += (self.num_cycles - cycle - 1) * self.scores[cycle, episode]
+                self.known[episode] = self.num_cycles
+        self.active[episodes] = self.known[episodes] < self.num_cycles
+
+        if self.thresholds is not None:
+            ctrls = np.unique(episodes // self.shape[1])
+            sums, known = self.sums.reshape(self.shape)[ctrls], self.known.reshape(self.shape)[ctrls]
+            upper = ((sums + (self.num_cycles - known) * self.max_cycle_fitness) / self.num_cycles).mean(axis=1)
+            stop = (upper < self.thresholds[ctrls]) & self.active.reshape(self.shape)[ctrls].any(axis=1)
+            self.bounded[ctrls[stop]] = True
+            self.bounds[ctrls[stop]] = upper[stop]
+            self.active.reshape(self.shape)[ctrls[stop]] = False
+
+    def record_one(self, cycle, episode, score, sensors, position):
+        """Faster equivalent of record for a single episode, used when episodes are simulated one by one.
+
+        Applies only the stagnation rule.
+        """
+        self._allocate_scores()
+        self.scores[cycle, episode] = score
+        self.sums[episode] += score
+        self.known[episode] = self.simulated[episode] = cycle + 1
+
+        if self.stagnation_window > 0:
+            if self.sensors is None:
+                self.sensors = np.full((len(self.active), len(sensors)), np.nan)
+                self.positions = np.full((len(self.active), 2), np.nan)
+            if (self.sensors[episode] == sensors).all() and (self.positions[episode] == position).all():
+                self.still[episode] += 1
+            else:
+                self.still[episode] = 0
+                self.sensors[episode] = sensors
+                self.positions[episode] = position
+            if self.still[episode] >= self.stagnation_window:
+                self.scores[cycle + 1:, episode] = score
+                self.sums[episode] += (self.num_cycles - cycle - 1) * score
+                self.known[episode] = self.num_cycles
+                self.active[episode] = False
+
+    def record_trajectories(self, scores):
+        """Store scores of whole episodes, array of shape (num_episodes, num_cycles), and stop all episodes."""
+        self._allocate_scores()
+        self.scores[:] = scores.T
+        self.sums[:] = scores.sum(axis=1)
+        self.known[:] = self.simulated[:] = self.num_cycles
+        self.active[:] = False
+
+    def _allocate_scores(self):
+        if self.scores is None:
+            self.scores = np.zeros((self.num_cycles, len(self.active)))
+
+    def fitness(self, aggregate_func):
+        """Return fitness of every controller."""
+        self._allocate_scores()
+        fitness = self.bounds.copy()
+        if isinstance(aggregate_func, RunningAggregator):
+            unbounded = ~self.bounded
+            fitness[unbounded] = aggregate_func(self.scores.T).reshape(self.shape)[unbounded].mean(axis=1)
+            return fitness
+        for i in np.flatnonzero(~self.bounded):
+            episodes = range(i * self.shape[1], (i + 1) * self.shape[1])
+            fitness[i] = np.mean([aggregate_func(self.scores[:, j]) for j in episodes])
+        return fitness
+
+    def work(self):
+        """Return fraction of cycles simulated for every controller, partial fitness function evaluations."""
+        return self.simulated.reshape(self.shape).mean(axis=1) / self.num_cycles
@@ -1,8 +1,10 @@
-from kheppy.evocom.commons import BaseAlgorithm
+import numpy as np
+
+from kheppy.evocom.commons import BaseAlgorithm, SteadyStateMixin
 from kheppy.evocom.de.population import PopulationDE
 
 
-class DiffEvolution(BaseAlgorithm):
+class DiffEvolution(SteadyStateMixin, BaseAlgorithm):
 
     def __init__(self):
         super().__init__()
@@ -34,16 +36,42 @@ class DiffEvolution(BaseAlgorithm):
         self.params['mut_strat'] = mut_strat
         return self
 
+    def _sim_demand(self):
+        # current population is evaluated together with candidates in the first epoch and with moving positions
+        return 2 * self.params['pop_size']
+
     def _get_init_pop(self):
         return PopulationDE(self.params['model'], self.params['pop_size']).initialize(self.params['param_init'])
 
     def _get_next_pop(self, pop):
+        timers = self._evaluator.timers
+        timers.lap()
         candidates = pop.get_candidate_pop(self.params['p_cross'], self.params['diff_weight'], self.params['mut_strat'])
-        to_evaluate = PopulationDE(candidates.network, candidates.pop)
+        timers.lap('variation')
+        to_evaluate, thresholds = candidates, pop.fitness
         if self.params['pos'] != 'static' or pop.average_fitness() == 0:
-            to_evaluate.pop += pop.pop
-        time = self._evaluate_pop(to_evaluate)
-        ffe = len(to_evaluate.pop) * self.params['num_sim']
+            to_evaluate, thresholds = PopulationDE(pop.network, np.concatenate([candidates.genomes, pop.genomes])), None
+        ffe, time = self._evaluate_pop(to_evaluate, thresholds)
+        if to_evaluate is not candidates:
+            candidates.fitness, pop.fitness = np.split(to_evaluate.fitness, [len(candidates)])
+
+        timers.lap()
+        keep = pop.fitness >= candidates.fitness
+        next_pop = PopulationDE(pop.network, np.where(keep[:, None], pop.genomes, candidates.genomes),
+                                np.where(keep, pop.fitness, candidates.fitness))
+        next_pop.bounded = np.where(keep, pop.bounded, candidates.bounded)
+        timers.lap('selection')
+        return next_pop, ffe, time
+
+    def _steady_candidate(self, pop, index):
+        # targets are visited in order, so every pop_size offspring compete with the whole population
+        target = index % len(pop)
+        genome = pop.candidates([target], self.params['p_cross'], self.params['diff_weight'],
+                                self.params['mut_strat'])[0]
+        return genome, pop.fitness[[target]]
 
-        final_list = [org if org.fitness >= cand.fitness else cand for org, cand in zip(pop.pop, candidates.pop)]
-        return PopulationDE(pop.network, final_list), ffe, time
+    def _steady_insert(self, pop, genome, fitness, index):
+        target = index % len(pop)
+        if fitness > pop.fitness[target]:
+            pop.genomes[target] = genome
+            pop.fitness[target] = fitness
@@ -1,37 +1,53 @@
 from kheppy.evocom.commons.population import Population
 from kheppy.evocom.de.individual import ControllerDE
-from numpy.random import choice
+from numpy.random import randint, uniform
+import numpy as np
 
 
 class PopulationDE(Population):
-
-    def initialize(self, init_limits):
-        self.pop = []
-        for _ in range(self.pop_size):
-            weights = self.network.random_weights_list(init_limits)
-            biases = self.network.random_biases_list(init_limits)
-            self.pop.append(ControllerDE(weights, biases))
-        return self
+    controller_type = ControllerDE
 
     def get_candidate_pop(self, p_cross, diff_weight, mut_strat):
-        candidates = []
-        best = self.best() if mut_strat != 'rand' else None
-        for i, ind in enumerate(self.pop):
-            ind_list = [x for x in range(len(self.pop)) if x != i and self.pop[x] != best]
-            a, b, c = choice(ind_list, 3, replace=False)
-
-            if mut_strat == 'rand':
-                cand = self.pop[a].add_diff_vector(self.pop[b], self.pop[c], diff_weight[0])
-            elif mut_strat == 'best':
-                cand = best.add_diff_vector(self.pop[b], self.pop[c], diff_weight[0])
-            elif mut_strat == 'rand-to-best':
-                cand = self.pop[a].add_diff_vector(self.pop[b], self.pop[c], diff_weight[0])
-                cand = cand.add_diff_vector(best, self.pop[a], diff_weight[1])
-            else:  # mut_strat == 'curr-to-best'
-                cand = ind.add_diff_vector(self.pop[b], self.pop[c], diff_weight[0])
-                cand = cand.add_diff_vector(best, ind, diff_weight[1])
-
-            final_cand = ind.binary_cross(cand, p_cross)
-            candidates.append(final_cand)
-
-        return PopulationDE(self.network, candidates)
+        return PopulationDE(self.network, self.candidates(np.arange(len(self)), p_cross, diff_weight, mut_strat))
+
+    def candidates(self, targets, p_cross, diff_weight, mut_strat):
+        """Return genome matrix with one candidate for every index in targets."""
+        pop, target = self.genomes, self.genomes[targets]
+        best = np.argmax(self.fitness) if mut_strat != 'rand' else None
+        a, b, c = self._draw_donors(best, targets).T
+
+        cand = pop[b]
+        cand -= pop[c]
+        cand *= diff_weight[0]
+        if mut_strat == 'rand':
+            cand += pop[a]
+        elif mut_strat == 'best':
+            cand += pop[best]
+        elif mut_strat == 'rand-to-best':
+            cand += pop[a] + diff_weight[1] * (pop[best] - pop[a])
+        else:  # mut_strat == 'curr-to-best'
+            cand += target + diff_weight[1] * (pop[best] - target)
+
+        return np.where(uniform(0, 1, target.shape) < p_cross, target, cand)
+
+    def _draw_donors(self, excluded=None, targets=None):
+        """Draw three distinct donor indices for every target individual (all individuals by default).
+
+        Donors of individual i are different from i and from 'excluded' index (if given).
+
+        :return: int array of shape (len(targets), 3)
+        """
+        size = len(self)
+        if size - 1 - (excluded is not None) < 3:
+            raise ValueError('Population is too small to draw 3 distinct donors for every individual.')
+
+        own = (np.arange(size) if targets is None else np.asarray(targets))[:, None]
+        donors = randint(0, size, (len(own), 3))
+        while True:
+            invalid = np.any(donors == own, axis=1)
+            invalid |= (donors[:, 0] == donors[:, 1]) | (donors[:, 0] == donors[:, 2]) | (donors[:, 1] == donors[:, 2])
+            if excluded is not None:
+                invalid |= np.any(donors == excluded, axis=1)
+            if not invalid.any():
+                return donors
+            donors[invalid] = randint(0, size, (np.count_nonzero(invalid), 3))
@@ -1,8 +1,8 @@
-from kheppy.evocom.commons import BaseAlgorithm
+from kheppy.evocom.commons import BaseAlgorithm, SteadyStateMixin
 from kheppy.evocom.ga.population import PopulationGA
 
 
-class GeneticAlgorithm(BaseAlgorithm):
+class GeneticAlgorithm(SteadyStateMixin, BaseAlgorithm):
 
     def __init__(self):
         super().__init__()
@@ -28,15 +28,31 @@ class GeneticAlgorithm(BaseAlgorithm):
 
         return self
 
+    def _sim_demand(self):
+        # parents plus offspring of every crossed pair
+        return self.params['pop_size'] + 2 * (self.params['pop_size'] // 2)
+
     def _get_init_pop(self):
         return PopulationGA(self.params['model'], self.params['pop_size']).initialize(self.params['param_init'])
 
     def _get_next_pop(self, pop):
+        timers = self._evaluator.timers
+        timers.lap()
         pop.cross(self.params['p_cross'])
         pop.mutate(self.params['p_mut'])
+        timers.lap('variation')
 
-        time = self._evaluate_pop(pop)
-        ffe = len(pop.pop) * self.params['num_sim']
+        ffe, time = self._evaluate_pop(pop)
 
+        timers.lap()
         next_pop = pop.select(self.params['sel_type'])
+        timers.lap('selection')
         return next_pop, ffe, time
+
+    def _steady_candidate(self, pop, index):
+        return pop.offspring(self.params['p_cross'], self.params['p_mut'], self.params['sel_type']), None
+
+    def _steady_insert(self, pop, genome, fitness, index):
+        # replacement tournament has the size of selection tournament, 2 with roulette wheel selection
+        sel_type = self.params['sel_type']
+        pop.replace(genome, fitness, sel_type if isinstance(sel_type, int) else 2)
@@ -1,43 +1,97 @@
 from kheppy.evocom.commons.population import Population
 from kheppy.evocom.ga.individual import ControllerGA
-from numpy.random import choice, uniform, shuffle
+from numpy.random import randint, uniform, permutation
 import numpy as np
 
 
 class PopulationGA(Population):
-
-    def initialize(self, init_limits):
-        self.pop = []
-        for _ in range(self.pop_size):
-            weights = self.network.random_weights_list(init_limits)
-            biases = self.network.random_biases_list(init_limits)
-            self.pop.append(ControllerGA(weights, biases))
-        return self
+    controller_type = ControllerGA
 
     def cross(self, prob):
-        shuffle(self.pop)
-        for i in range(0, len(self.pop), 2):
-            if uniform() < prob:
-                c1_new, c2_new = self.pop[i].cross(self.pop[i + 1])
-                self.pop.append(c1_new)
-                self.pop.append(c2_new)
+        """One-point crossover applied separately to every weight matrix and bias vector of paired genomes.
+
+        Population is shuffled and split into consecutive pairs, each pair is crossed with probability prob.
+        Offspring are appended to the population.
+        """
+        order = permutation(len(self))
+        self.genomes, self.fitness = self.genomes[order], self.fitness[order]
+
+        num_pairs = len(self) // 2
+        pairs = self.genomes[:2 * num_pairs].reshape(num_pairs, 2, -1)
+        pairs = pairs[uniform(size=num_pairs) < prob]
+
+        from_first = self._crossover_masks(len(pairs))
+        fst, snd = pairs[:, 0], pairs[:, 1]
+        offspring = np.stack([np.where(from_first, fst, snd), np.where(from_first, snd, fst)], axis=1)
+        self.genomes = np.concatenate([self.genomes, offspring.reshape(-1, self.network.genome_len)])
+        self.fitness = np.concatenate([self.fitness, np.zeros(2 * len(pairs))])
+        self.bounded = np.zeros(len(self.genomes), dtype=bool)
+
+    def _crossover_masks(self, num_pairs):
+        """Draw one cut point in every segment for each pair, return masks of genes taken from the first parent."""
+        bounds = np.array(self.network.segments())
+        lengths = bounds[:, 1] - bounds[:, 0]
+        segment = np.repeat(np.arange(len(bounds)), lengths)
+        offset = np.arange(self.network.genome_len) - bounds[segment, 0]
+        cut_points = randint(0, lengths, (num_pairs, len(bounds)))
+        return offset < cut_points[:, segment]
 
     def mutate(self, prob):
-        for controller in self.pop:
-            controller.mutate(prob)
+        mutated = uniform(0, 1, self.genomes.shape) < prob
+        self.genomes[mutated] += uniform(-0.05, 0.05, np.count_nonzero(mutated))
 
     def select(self, sel_type):
+        winners = self._select_indices(sel_type, self.pop_size)
+        return PopulationGA(self.network, self.genomes[winners], self.fitness[winners])
+
+    def _select_indices(self, sel_type, num_winners):
         if isinstance(sel_type, int):
-            new_pop = []
-            for _ in range(self.pop_size):
-                group = choice(len(self.pop), sel_type, replace=False).tolist()
-                max_ind = np.argmax([self.pop[i].fitness for i in group])
-                best = self.pop[group[max_ind]]
-                new_pop.append(best.copy())
-        else:
-            cum_fit = np.cumsum([elem.fitness for elem in self.pop])
-            draws = np.random.uniform(0, cum_fit[-1], self.pop_size)
-            indices = np.searchsorted(cum_fit, draws)
-            new_pop = [self.pop[ind].copy() for ind in indices]
-
-        return PopulationGA(self.network, new_pop)
+            groups = self._tournament_groups(sel_type, num_winners)
+            return groups[np.arange(len(groups)), np.argmax(self.fitness[groups], axis=1)]
+        cum_fit = np.cumsum(self.fitness)
+        draws = uniform(0, cum_fit[-1], num_winners)
+        return np.searchsorted(cum_fit, draws)
+
+    def offspring(self, p_cross, p_mut, sel_type):
+        """Create one offspring for steady-state evolution.
+
+        Two parents are selected with sel_type, crossed with probability p_cross as in cross (the first child
+        is kept) and the child is mutated as in mutate.
+        """
+        fst, snd = self.genomes[self._select_indices(sel_type, 2)]
+        child = fst.copy()
+        if uniform() < p_cross:
+            child = np.where(self._crossover_masks(1)[0], fst, snd)
+        mutated = uniform(0, 1, child.shape) < p_mut
+        child[mutated] += uniform(-0.05, 0.05, np.count_nonzero(mutated))
+        return child
+
+    def replace(self, genome, fitness, size):
+        """Tournament replacement: genome takes place of the worst of 'size' random individuals if it is better.
+
+        :return: True if genome was inserted
+        """
+        group = self._tournament_groups(size, 1)[0]
+        loser = group[np.argmin(self.fitness[group])]
+        if fitness <= self.fitness[loser]:
+            return False
+        self.genomes[loser] = genome
+        self.fitness[loser] = fitness
+        return True
+
+    def _tournament_groups(self, size, num_groups=None):
+        """Draw num_groups (pop_size by default) groups of 'size' distinct indices each."""
+        if num_groups is None:
+            num_groups = self.pop_size
+        if size > len(self):
+            raise ValueError('Tournament size cannot be larger than population size.')
+        if size * size > len(self):
+            return np.argsort(uniform(size=(num_groups, len(self))), axis=1)[:, :size]
+
+        groups = randint(0, len(self), (num_groups, size))
+        while True:
+            sorted_groups = np.sort(groups, axis=1)
+            repeated = np.any(sorted_groups[:, 1:] == sorted_groups[:, :-1], axis=1)
+            if not repeated.any():
+                return groups
+            groups[repeated] = randint(0, len(self), (np.count_nonzero(repeated), size))
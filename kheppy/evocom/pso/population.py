@@ -1,67 +1,86 @@
 import numpy as np
-import math
+from numpy.random import uniform
 
 from kheppy.evocom.commons.population import Population
 from kheppy.evocom.pso.individual import ControllerPSO
 
 
 class PopulationPSO(Population):
+    controller_type = ControllerPSO
 
-    def __init__(self, network, pop_list):
-        super().__init__(network, pop_list)
+    def __init__(self, network, pop_list, fitness=None):
+        super().__init__(network, pop_list, fitness)
+        self.velocities = None
+        self.local_best = None
+        self.local_best_fitness = None
         self.global_best = None
         self.limits = (0, 0)
 
     def initialize(self, init_limits):
+        super().initialize(init_limits)
         self.limits = init_limits
-        self.pop = []
-        for _ in range(self.pop_size):
-            weights = self.network.random_weights_list(init_limits)
-            biases = self.network.random_biases_list(init_limits)
-            velocities = [None, None]
-            velocities[0] = self.network.random_weights_list(init_limits)
-            velocities[1] = self.network.random_biases_list(init_limits)
-            self.pop.append(ControllerPSO(weights, biases, velocities))
+        self.velocities = self.network.random_genomes(self.pop_size, init_limits)
         return self
 
     def update_global_best(self):
-        max_ind = np.argmax([controller.local_best.fitness for controller in self.pop])
-        self.global_best = self.pop[max_ind].local_best.copy()
+        max_ind = np.argmax(self.local_best_fitness)
+        self.global_best = ControllerPSO(self.network, self.local_best[max_ind].copy(),
+                                         self.local_best_fitness[max_ind])
 
     def update_local_best(self):
-        for controller in self.pop:
-            controller.update_local_best()
+        if self.local_best is None:
+            self.local_best = self.genomes.copy()
+            self.local_best_fitness = self.fitness.copy()
+            return
+
+        improved = self.local_best_fitness < self.fitness
+        self.local_best[improved] = self.genomes[improved]
+        self.local_best_fitness[improved] = self.fitness[improved]
 
     def move_particles(self, inertia, cognitive_param, social_param):
-        for controller in self.pop:
-            rnd_lws = self.network.random_weights_list((0, 1))
-            rnd_gws = self.network.random_weights_list((0, 1))
-            for i in range(len(controller.weights)):
-                cwv = controller.velocities[0][i]
-                cw = controller.weights[i]
-                lw = controller.local_best.weights[i]
-                gw = self.global_best.weights[i]
-                nwv = inertia * cwv + rnd_lws[i] * cognitive_param * (lw - cw) + rnd_gws[i] * social_param * (gw - cw)
-                controller.velocities[0][i] = nwv
-                controller.velocities[0][i] = np.clip(controller.velocities[0][i], 2 * self.limits[0], 2 * self.limits[1])
-                controller.weights[i] += controller.velocities[0][i]
-                controller.weights[i] = np.clip(controller.weights[i], self.limits[0], self.limits[1])
-
-            rnd_lbs = self.network.random_biases_list((0, 1))
-            rnd_gbs = self.network.random_biases_list((0, 1))
-            for i in range(len(controller.biases)):
-                cbv = controller.velocities[1][i]
-                cb = controller.biases[i]
-                lb = controller.local_best.biases[i]
-                gb = self.global_best.biases[i]
-                nbv = inertia * cbv + rnd_lbs[i] * cognitive_param * (lb - cb) + rnd_gbs[i] * social_param * (gb - cb)
-                controller.velocities[1][i] = nbv
-                controller.velocities[1][i] = np.clip(controller.velocities[1][i], 2 * self.limits[0], 2 * self.limits[1])
-                controller.biases[i] += controller.velocities[1][i]
-                controller.biases[i] = np.clip(controller.biases[i], self.limits[0], self.limits[1])
-
-    def local_bests(self):
-        return [controller.local_best for controller in self.pop]
+        """Update velocities and positions of the whole swarm at once.
+
+        Velocities are clipped to twice the initialization limits, positions to the initialization limits.
+        """
+        rnd_local, rnd_global = uniform(0, 1, (2,) + self.genomes.shape).astype(self.genomes.dtype, copy=False)
+        rnd_local *= cognitive_param
+        rnd_local *= self.local_best - self.genomes
+        rnd_global *= social_param
+        rnd_global *= self.global_best.genome - self.genomes
+
+        self.velocities *= inertia
+        self.velocities += rnd_local
+        self.velocities += rnd_global
+        np.clip(self.velocities, 2 * self.limits[0], 2 * self.limits[1], out=self.velocities)
+        self.genomes += self.velocities
+        np.clip(self.genomes, self.limits[0], self.limits[1], out=self.genomes)
+
+    def emigrants(self, count):
+        order = np.argsort(-self.local_best_fitness, kind='stable')[:count]
+        return self.local_best[order].copy(), self.local_best_fitness[order].copy()
+
+    def immigrate(self, genomes, fitness):
+        replaced = super().immigrate(genomes, fitness)
+        self.local_best[replaced] = self.genomes[replaced]
+        self.local_best_fitness[replaced] = self.fitness[replaced]
+        self.update_global_best()
+        return replaced
+
+    def get_state(self):
+        state = super().get_state()
+        state.update({'velocities': self.velocities, 'local_best': self.local_best,
+                      'local_best_fitness': self.local_best_fitness, 'global_best': self.global_best.genome,
+                      'global_best_fitness': np.array(self.global_best.fitness), 'limits': np.array(self.limits)})
+        return state
+
+    def set_state(self, state):
+        super().set_state(state)
+        self.velocities = np.asarray(state['velocities'], self.network.dtype)
+        self.local_best = np.asarray(state['local_best'], self.network.dtype)
+        self.local_best_fitness = state['local_best_fitness']
+        self.global_best = ControllerPSO(self.network, state['global_best'], state['global_best_fitness'][()])
+        self.limits = tuple(state['limits'])
+        return self
 
     def best(self):
         return self.global_best
@@ -1,3 +1,5 @@
+import numpy as np
+
 from kheppy.evocom.commons import BaseAlgorithm
 from kheppy.evocom.pso.population import PopulationPSO
 
@@ -25,21 +27,30 @@ class PartSwarmOpt(BaseAlgorithm):
         self.params['social'] = social_param
         return self
 
+    def _sim_demand(self):
+        # local bests are re-evaluated together with particles only when positions change
+        return self.params['pop_size'] * (1 if self.params['pos'] == 'static' else 2)
+
     def _get_init_pop(self):
         pop = PopulationPSO(self.params['model'], self.params['pop_size']).initialize(self.params['param_init'])
         pop.update_local_best()
         return pop
 
     def _get_next_pop(self, pop):
+        to_evaluate, thresholds = pop, pop.local_best_fitness
         if self.params['pos'] != 'static':
-            pop.pop += pop.local_bests()
-
-        time = self._evaluate_pop(pop)
-        ffe = len(pop.pop) * self.params['num_sim']
+            to_evaluate, thresholds = PopulationPSO(pop.network, np.concatenate([pop.genomes, pop.local_best])), None
 
-        pop.pop = pop.pop[:pop.pop_size]
+        ffe, time = self._evaluate_pop(to_evaluate, thresholds)
+        if to_evaluate is not pop:
+            pop.fitness, pop.local_best_fitness = np.split(to_evaluate.fitness, [pop.pop_size])
+            pop.bounded = to_evaluate.bounded[:pop.pop_size]
 
+        timers = self._evaluator.timers
+        timers.lap()
         pop.update_local_best()
         pop.update_global_best()
+        timers.lap('selection')
         pop.move_particles(self.params['inertia'], self.params['cognitive'], self.params['social'])
+        timers.lap('variation')
         return pop, ffe, time
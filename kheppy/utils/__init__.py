@@ -1,2 +1,5 @@
 from .misc import timestamp
-from .reporting import Reporter
+from .reporting import Reporter, StreamingReporter, ReportReader
+from .profiling import Timers, SamplingProfiler, PHASES
+from .aggregation import RunningAggregator, DiscountedSum, running_mean, running_min, running_max
+from .recording import TrajectoryRecorder, Trajectories
@@ -0,0 +1,85 @@
+from abc import ABC, abstractmethod
+import numpy as np
+
+
+class RunningAggregator(ABC):
+    """
+    Aggregate of per-cycle scores computed one cycle at a time in constant memory:
+        state = agg.start()
+        state = agg.update(state, cycle, score)     # for every cycle
+        agg.result(state, num_cycles)
+
+    Scores may be scalars or arrays with one value per episode. Aggregators are also callable on whole arrays of
+    scores, reducing the last axis like np.mean(scores, axis=-1), so they can be used as aggregate_func anywhere.
+    """
+
+    initial = 0.
+
+    def start(self):
+        return self.initial
+
+    @abstractmethod
+    def update(self, state, cycle, score):
+        pass
+
+    def result(self, state, num_cycles):
+        return state
+
+    @abstractmethod
+    def __call__(self, scores):
+        pass
+
+
+class RunningMean(RunningAggregator):
+
+    def update(self, state, cycle, score):
+        return state + score
+
+    def result(self, state, num_cycles):
+        return state / num_cycles
+
+    def __call__(self, scores):
+        return np.mean(scores, axis=-1)
+
+
+class RunningMin(RunningAggregator):
+
+    initial = np.inf
+
+    def update(self, state, cycle, score):
+        return np.minimum(state, score)
+
+    def __call__(self, scores):
+        return np.min(scores, axis=-1)
+
+
+class RunningMax(RunningAggregator):
+
+    initial = -np.inf
+
+    def update(self, state, cycle, score):
+        return np.maximum(state, score)
+
+    def __call__(self, scores):
+        return np.max(scores, axis=-1)
+
+
+class DiscountedSum(RunningAggregator):
+    """
+    Sum of scores weighted by gamma ** cycle.
+    """
+
+    def __init__(self, gamma=0.99):
+        self.gamma = gamma
+
+    def update(self, state, cycle, score):
+        return state + self.gamma ** cycle * score
+
+    def __call__(self, scores):
+        scores = np.asarray(scores)
+        return scores @ self.gamma ** np.arange(scores.shape[-1])
+
+
+running_mean = RunningMean()
+running_min = RunningMin()
+running_max = RunningMax()
@@ -6,3 +6,28 @@ def avoid_collision(sensors, left_motor, right_motor):
     movement_factor = 1 - np.sqrt(abs(left_motor - right_motor) / 2)
     proximity_factor = 1 - np.max(sensors)
     return speed_factor * movement_factor * proximity_factor
+
+
+def trajectory(func):
+    """Mark func as trajectory fitness function.
+
+    Trajectory fitness functions receive whole episodes, possibly many at once: sensors of shape
+    (..., num_cycles, sensor_count) read after every cycle and motors (network outputs) of shape (..., num_cycles, 2),
+    and return per-cycle scores of shape (..., num_cycles), which are aggregated as usual.
+    """
+    func.trajectory = True
+    return func
+
+
+def is_trajectory(func):
+    return getattr(func, 'trajectory', False)
+
+
+@trajectory
+def avoid_collision_trajectory(sensors, motors):
+    """avoid_collision computed for whole trajectories."""
+    left, right = motors[..., 0], motors[..., 1]
+    speed_factor = (np.abs(left) + np.abs(right)) / 2
+    movement_factor = 1 - np.sqrt(np.abs(left - right) / 2)
+    proximity_factor = 1 - np.max(sensors, axis=-1)
+    return speed_factor * movement_factor * proximity_factor
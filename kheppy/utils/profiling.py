@@ -0,0 +1,129 @@
+import signal
+from collections import Counter
+from timeit import default_timer as timer
+
+PHASES = ('inference', 'stepping', 'sensors', 'fitness', 'variation', 'selection', 'ipc', 'pool_startup',
+          'replication')
+
+
+class Timers:
+    """
+    Accumulates wall time and number of measurements of evolution phases (see PHASES).
+
+    Time between consecutive laps is added to the phase named in the later one:
+        timers.lap()                # start measuring
+        predict(...)
+        timers.lap('inference')     # time since previous lap is added to 'inference'
+    """
+
+    enabled = True
+
+    def __init__(self):
+        self.times = dict.fromkeys(PHASES, 0.)
+        self.counts = dict.fromkeys(PHASES, 0)
+        self._last = timer()
+
+    def lap(self, phase=None):
+        now = timer()
+        if phase is not None:
+            self.times[phase] += now - self._last
+            self.counts[phase] += 1
+        self._last = now
+
+    def add(self, phase, seconds, count=1):
+        self.times[phase] += seconds
+        self.counts[phase] += count
+
+    def merge(self, state):
+        """Add measurements returned by pop() of another Timers object."""
+        if state is not None:
+            for phase, (seconds, count) in zip(PHASES, zip(*state)):
+                self.add(phase, seconds, count)
+
+    def pop(self):
+        """Return tuple (times, counts) of lists ordered as PHASES and zero all measurements."""
+        state = [self.times[phase] for phase in PHASES], [self.counts[phase] for phase in PHASES]
+        self.times = dict.fromkeys(PHASES, 0.)
+        self.counts = dict.fromkeys(PHASES, 0)
+        return state
+
+
+class NullTimers(Timers):
+    """
+    Timers which measure nothing, used when profiling is turned off.
+    """
+
+    enabled = False
+
+    def lap(self, phase=None):
+        pass
+
+    def add(self, phase, seconds, count=1):
+        pass
+
+    def merge(self, state):
+        pass
+
+    def pop(self):
+        return None
+
+
+NULL_TIMERS = NullTimers()
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler of the main thread, sampling Python call stack every 'interval' seconds of CPU time.
+
+    Time spent in native calls is attributed to the Python line which made them. Available only on platforms
+    supporting signal.setitimer.
+    """
+
+    def __init__(self, interval=0.001):
+        if not hasattr(signal, 'setitimer'):
+            raise RuntimeError('Sampling profiler is not supported on this platform.')
+        self.interval = interval
+        self.own = Counter()
+        self.total = Counter()
+        self.num_samples = 0
+        self._previous_handler = None
+
+    def _sample(self, signum, frame):
+        self.num_samples += 1
+        seen = set()
+        leaf = True
+        while frame is not None:
+            code = frame.f_code
+            key = (code.co_name, code.co_filename, code.co_firstlineno)
+            if leaf:
+                self.own[key] += 1
+                leaf = False
+            if key not in seen:
+                self.total[key] += 1
+                seen.add(key)
+            frame = frame.f_back
+
+    def start(self):
+        self._previous_handler = signal.signal(signal.SIGPROF, self._sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def stop(self):
+        signal.setitimer(signal.ITIMER_PROF, 0)
+        signal.signal(signal.SIGPROF, self._previous_handler)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def report(self, limit=20):
+        """Return text table of functions with the largest number of own samples."""
+        lines = ['{:>7} {:>7}  {}'.format('own %', 'total %', 'function')]
+        for key, own in self.own.most_common(limit):
+            name, filename, line = key
+            lines.append('{:>7.2f} {:>7.2f}  {} ({}:{})'.format(100. * own / self.num_samples,
+                                                               100. * self.total[key] / self.num_samples,
+                                                               name, filename, line))
+        return '\n'.join(lines)
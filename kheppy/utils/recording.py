@@ -0,0 +1,84 @@
+import os
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+INDEX_DTYPE = np.dtype([('cycles', '<i4'), ('fitness', '<f8'), ('start', '<f4', (2,))])
+
+
+class TrajectoryRecorder:
+    """
+    Records sensor states, motor outputs and robot positions of every cycle of many episodes into memory-mapped
+    .npy files of a directory:
+        sensors.npy     (num_episodes, num_cycles, sensor_count)
+        motors.npy      (num_episodes, num_cycles, 2)
+        positions.npy   (num_episodes, num_cycles, 2)
+        index.npy       num_episodes records of INDEX_DTYPE: number of recorded cycles, fitness, starting position
+
+    Sensors and positions are read after every cycle. Files are allocated at once, so episodes can be written in
+    any order, also by other processes which opened the directory with mode='r+'. Use Trajectories to read them.
+    """
+
+    def __init__(self, directory, num_episodes=None, num_cycles=None, sensor_count=None, dtype=np.float32,
+                 mode='w+'):
+        self.directory = directory
+        if mode == 'w+':
+            if not os.path.exists(directory):
+                os.makedirs(directory)
+            shapes = {'sensors': (num_episodes, num_cycles, sensor_count), 'motors': (num_episodes, num_cycles, 2),
+                      'positions': (num_episodes, num_cycles, 2)}
+            arrays = {name: open_memmap(self._path(name), 'w+', dtype, shape) for name, shape in shapes.items()}
+            self.index = open_memmap(self._path('index'), 'w+', INDEX_DTYPE, (num_episodes,))
+        else:
+            arrays = {name: open_memmap(self._path(name), mode) for name in ('sensors', 'motors', 'positions')}
+            self.index = open_memmap(self._path('index'), mode)
+        self.sensors, self.motors, self.positions = arrays['sensors'], arrays['motors'], arrays['positions']
+
+    def _path(self, name):
+        return os.path.join(self.directory, name + '.npy')
+
+    def episode(self, episode):
+        """Return tuple of (num_cycles, ...) views (sensors, motors, positions) to be filled by run_episode."""
+        # plain ndarray views, writing rows of memmap objects is several times slower
+        return tuple(array[episode].view(np.ndarray) for array in (self.sensors, self.motors, self.positions))
+
+    def finish(self, episode, cycles, fitness, start):
+        self.index[episode] = (cycles, fitness, start)
+
+    def flush(self):
+        for array in (self.sensors, self.motors, self.positions, self.index):
+            array.flush()
+
+    def close(self):
+        self.flush()
+        self.sensors = self.motors = self.positions = self.index = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class Trajectories:
+    """
+    Read-only view of trajectories written by TrajectoryRecorder.
+
+    Attributes sensors, motors, positions and index are memory-mapped arrays, so any slice of them (e.g. positions
+    of all episodes in cycle 10, positions[:, 10]) is read from disk only when used.
+    """
+
+    def __init__(self, directory):
+        recorder = TrajectoryRecorder(directory, mode='r')
+        self.sensors, self.motors, self.positions = recorder.sensors, recorder.motors, recorder.positions
+        self.index = recorder.index
+
+    def episode(self, episode):
+        """Return dictionary of arrays of the recorded cycles of an episode."""
+        cycles = self.index['cycles'][episode]
+        return {'sensors': self.sensors[episode, :cycles], 'motors': self.motors[episode, :cycles],
+                'positions': self.positions[episode, :cycles], 'fitness': self.index['fitness'][episode],
+                'start': self.index['start'][episode]}
+
+    def __len__(self):
+        return len(self.index)
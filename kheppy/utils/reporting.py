@@ -1,6 +1,9 @@
+import json
+import os
 import pickle
 import warnings
-from collections import OrderedDict
+from collections import OrderedDict, deque
+import numpy as np
 
 
 class Reporter:
@@ -27,6 +30,13 @@ class Reporter:
         else:
             warnings.warn('Omitting entry {}.'.format(entry))
 
+    def get_state(self):
+        """Return picklable reporter state, used in checkpoints."""
+        return self.entries
+
+    def set_state(self, state):
+        self.entries = state
+
     def save(self, path):
         with open(path, 'wb') as f:
             pickle.dump(self.entries, f)
@@ -37,3 +47,149 @@ class Reporter:
         with open(path, 'rb') as f:
             rep.entries = pickle.load(f)
         return rep
+
+
+class StreamingReporter(Reporter):
+    """
+    Reporter writing every entry to disk as it is put, keeping only last 'window' values in memory.
+
+    Each entry is a fixed-dtype column stored as raw little-endian rows in file
+    'directory/series_NNN/<entry>.bin'. Dtype and row shape of a column are taken from 'dtypes' (entry to dtype
+    mapping, float64 by default) and the first value put, and are recorded in 'directory/series_NNN/schema.json'.
+    Files are flushed after every put, so an interrupted run keeps everything reported so far.
+    A new reporter starts a new series after those already in the directory, only set_state (resuming from
+    a checkpoint) continues an existing one. Use ReportReader to read the columns back.
+    """
+
+    def __init__(self, directory, entries_names, window=100, dtypes=None):
+        super().__init__(entries_names)
+        self.directory = directory
+        self.window = window
+        self.dtypes = dict(dtypes) if dtypes is not None else {}
+        self.schema = {}
+        self.series = 0
+        self.rows = {}
+        self.files = {}
+        self.entries = OrderedDict([(entry, [deque(maxlen=window)]) for entry in entries_names])
+        # series directory is created with the first value put
+        while os.path.exists(self._series_dir(self.series)):
+            self.series += 1
+
+    def _series_dir(self, series):
+        return os.path.join(self.directory, 'series_{:03}'.format(series))
+
+    def move_to_new_series(self):
+        self._close_files()
+        self.series += 1
+        self.schema = {}
+        self.rows = {}
+        for entry in self.entries.values():
+            entry[:] = [deque(maxlen=self.window)]
+
+    def _put(self, entry, value):
+        if entry not in self.entries:
+            warnings.warn('Omitting entry {}.'.format(entry))
+            return
+        self.entries[entry][-1].append(value)
+
+        if entry not in self.schema:
+            value = np.asarray(value, dtype=self.dtypes.get(entry, np.float64))
+            self.schema[entry] = {'dtype': value.dtype.newbyteorder('<').str, 'shape': list(value.shape)}
+            self._write_schema()
+        column = self.schema[entry]
+        row = np.asarray(value, dtype=column['dtype'])
+        if list(row.shape) != column['shape']:
+            raise ValueError('Value of entry {} has shape {}, expected {}.'.format(entry, row.shape, column['shape']))
+
+        if entry not in self.files:
+            self.files[entry] = open(os.path.join(self._series_dir(self.series), entry + '.bin'), 'ab')
+        self.files[entry].write(row.tobytes())
+        self.files[entry].flush()
+        self.rows[entry] = self.rows.get(entry, 0) + 1
+
+    def _write_schema(self):
+        series_dir = self._series_dir(self.series)
+        os.makedirs(series_dir, exist_ok=True)
+        tmp_path = os.path.join(series_dir, 'schema.json.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(self.schema, f)
+        os.replace(tmp_path, os.path.join(series_dir, 'schema.json'))
+
+    def get_state(self):
+        return {'entries': self.entries, 'series': self.series, 'rows': dict(self.rows)}
+
+    def set_state(self, state):
+        """Restore in-memory window and truncate on-disk columns to the rows present when state was taken."""
+        self._close_files()
+        self.entries, self.series, self.rows = state['entries'], state['series'], dict(state['rows'])
+        series_dir = self._series_dir(self.series)
+        self.schema = _read_schema(self.directory, self.series)
+        for entry in self.entries:
+            path = os.path.join(series_dir, entry + '.bin')
+            if os.path.exists(path):
+                column = self.schema[entry]
+                row_size = np.dtype(column['dtype']).itemsize * int(np.prod(column['shape']))
+                with open(path, 'r+b') as f:
+                    f.truncate(self.rows.get(entry, 0) * row_size)
+
+    def _close_files(self):
+        for f in self.files.values():
+            f.close()
+        self.files = {}
+
+    def close(self):
+        self._close_files()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def _read_schema(directory, series):
+    """Return schema of a series, {} if nothing was written to it yet."""
+    for path in (os.path.join(directory, 'series_{:03}'.format(series), 'schema.json'),
+                 os.path.join(directory, 'schema.json')):  # shared by all series in older reports
+        if os.path.exists(path):
+            with open(path) as f:
+                return json.load(f)
+    return {}
+
+
+class ReportReader:
+    """
+    Lazy reader of StreamingReporter output. Columns are memory-mapped, incomplete trailing rows are ignored.
+
+    Example:
+        reader = ReportReader('/path/to/report')
+        max_fitness = reader['max']            # last series
+        first_run = reader.read('avg', 0)
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.num_series = 0
+        while os.path.exists(os.path.join(directory, 'series_{:03}'.format(self.num_series))):
+            self.num_series += 1
+        self.schema = _read_schema(directory, self.num_series - 1)
+
+    @property
+    def entries(self):
+        """Entries of the last series."""
+        return list(self.schema)
+
+    def read(self, entry, series=-1):
+        """Return memory-mapped array of shape (num_rows, *row_shape) with values of entry in given series."""
+        if series < 0:
+            series += self.num_series
+        column = _read_schema(self.directory, series)[entry]
+        dtype, shape = np.dtype(column['dtype']), tuple(column['shape'])
+        path = os.path.join(self.directory, 'series_{:03}'.format(series), entry + '.bin')
+        num_rows = os.path.getsize(path) // (dtype.itemsize * int(np.prod(shape))) if os.path.exists(path) else 0
+        if num_rows == 0:
+            return np.empty((0,) + shape, dtype)
+        return np.memmap(path, dtype, 'r', shape=(num_rows,) + shape)
+
+    def __getitem__(self, entry):
+        return self.read(entry)
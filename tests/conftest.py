@@ -0,0 +1,22 @@
+import os
+
+import pytest
+
+if 'KHEPERA_LIB' not in os.environ:
+    # stand-in engine library of the benchmarks, compiled on first use; set before kheppy is imported
+    from benchmarks.stub import build
+    os.environ['KHEPERA_LIB'] = build()
+
+from kheppy.evocom.commons import NeuralNet  # noqa: E402
+
+WORLDS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'examples', 'worlds')
+
+
+@pytest.fixture
+def world():
+    return os.path.join(WORLDS_DIR, 'circles_asym.wd')
+
+
+@pytest.fixture
+def model():
+    return NeuralNet(8).add_layer(10, 'relu').add_layer(2, 'tanh')
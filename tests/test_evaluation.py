@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from kheppy.evocom.commons.evaluation import Evaluator, WorkerPool
+from kheppy.evocom.ga import GeneticAlgorithm
+from kheppy.utils.fitfunc import avoid_collision
+
+
+def evaluate(model, world, genomes, thresholds, lockstep, num_proc=1, **kwargs):
+    algorithm = GeneticAlgorithm().eval_params(model, avoid_collision, num_cycles=60, num_positions=3,
+                                               lockstep=lockstep, **kwargs)
+    algorithm.sim_params(world, robot_id=1)
+    if num_proc == 1:
+        evaluator = Evaluator(algorithm.params, len(genomes))
+    else:
+        evaluator = WorkerPool(algorithm.params, len(genomes), num_proc)
+    with evaluator:
+        evaluator.update_positions('shuffle_defaults', {'seed': 5})
+        fitness, _ = evaluator.evaluate(genomes, thresholds)
+        return fitness, evaluator.bounded, evaluator.evaluations
+
+
+@pytest.mark.parametrize('termination', [{}, {'stagnation_window': 3},
+                                         {'stagnation_window': 3, 'max_cycle_fitness': 1}])
+def test_serial_and_lockstep_results_are_equal(model, world, termination):
+    genomes = np.random.RandomState(0).uniform(-1, 1, (12, model.genome_len))
+    thresholds = np.full(len(genomes), 0.05) if 'max_cycle_fitness' in termination else None
+    serial = evaluate(model, world, genomes, thresholds, False, **termination)
+    for lockstep, num_proc in ((True, 1), (False, 2), (True, 3)):
+        other = evaluate(model, world, genomes, thresholds, lockstep, num_proc, **termination)
+        np.testing.assert_allclose(other[0], serial[0], rtol=0, atol=1e-12)
+        np.testing.assert_array_equal(other[1], serial[1])
+        assert other[2] == pytest.approx(serial[2])
+    if thresholds is not None:
+        assert serial[1].any() and not serial[1].all()
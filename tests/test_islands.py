@@ -0,0 +1,25 @@
+import pytest
+
+from kheppy.evocom.commons import IslandModel
+from kheppy.evocom.pso import PartSwarmOpt
+from kheppy.utils.fitfunc import avoid_collision
+
+
+def pso(model, world, pop_size):
+    algorithm = PartSwarmOpt().eval_params(model, avoid_collision, num_cycles=20)
+    return algorithm.sim_params(world, robot_id=1).main_params(pop_size=pop_size, max_epochs=4)
+
+
+def test_full_topology_receives_at_most_num_migrants(model, world):
+    # 3 other islands send 3 emigrants each, more than the 6 simulation slots of an island
+    islands = IslandModel(pso(model, world, 6), num_islands=4, migration_interval=2, num_migrants=3,
+                          topology='full')
+    islands.run(seed=1)
+    assert len(islands.reporters) == 4
+    assert len(islands.reporter.entries['max'][-1]) == 4
+    assert islands.best is not None
+
+
+def test_migrants_have_to_fit_population(model, world):
+    with pytest.raises(ValueError):
+        IslandModel(pso(model, world, 6), num_migrants=6)
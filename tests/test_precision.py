@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+
+from kheppy.evocom.commons import NeuralNet
+from kheppy.evocom.commons.evaluation import Evaluator
+from kheppy.evocom.ga import GeneticAlgorithm
+from kheppy.utils.fitfunc import avoid_collision
+
+
+def evaluate(world, genomes, dtype, lockstep, backend='native'):
+    model = NeuralNet(8, dtype=dtype).add_layer(10, 'relu').add_layer(2, 'tanh')
+    algorithm = GeneticAlgorithm().eval_params(model, avoid_collision, num_cycles=60, num_positions=3,
+                                               lockstep=lockstep)
+    algorithm.sim_params(world, robot_id=1, backend=backend)
+    with Evaluator(algorithm.params, len(genomes)) as evaluator:
+        evaluator.update_positions('shuffle_defaults', {'seed': 5})
+        fitness, _ = evaluator.evaluate(genomes.astype(dtype))
+        return fitness
+
+
+@pytest.mark.parametrize('lockstep,backend', [(False, 'native'), (True, 'native'), (False, 'numpy')])
+def test_float32_fitness_matches_float64(model, world, lockstep, backend):
+    genomes = np.random.RandomState(0).uniform(-1, 1, (12, model.genome_len))
+    reference = evaluate(world, genomes, np.float64, False, backend)
+    single = evaluate(world, genomes, np.float32, lockstep, backend)
+    np.testing.assert_allclose(single, reference, rtol=0, atol=1e-3)
@@ -0,0 +1,37 @@
+import numpy as np
+
+from kheppy.evocom.ga import GeneticAlgorithm
+from kheppy.utils import ReportReader
+from kheppy.utils.fitfunc import avoid_collision
+
+
+def genetic_algorithm(model, world, directory, num_positions, max_epochs):
+    algorithm = GeneticAlgorithm().eval_params(model, avoid_collision, num_cycles=20, num_positions=num_positions)
+    algorithm.sim_params(world, robot_id=1).main_params(pop_size=6, max_epochs=max_epochs)
+    return algorithm.stream_report(directory)
+
+
+def test_runs_into_same_directory_write_separate_series(model, world, tmp_path):
+    first = genetic_algorithm(model, world, str(tmp_path), 2, 3)
+    first.run(seed=1)
+    # different number of starting positions changes shape of 'start_pos' rows
+    second = genetic_algorithm(model, world, str(tmp_path), 3, 2)
+    second.run(seed=2)
+
+    reader = ReportReader(str(tmp_path))
+    assert reader.num_series == 2
+    np.testing.assert_array_equal(reader.read('max', 0), list(first.reporter.entries['max'][-1]))
+    np.testing.assert_array_equal(reader.read('max', 1), list(second.reporter.entries['max'][-1]))
+    assert reader.read('start_pos', 0).shape == (3, 2, 2)
+    assert reader['start_pos'].shape == (2, 3, 2)
+
+
+def test_resumed_run_continues_its_series(model, world, tmp_path):
+    reports, checkpoint = str(tmp_path / 'reports'), str(tmp_path / 'checkpoint.bin')
+    genetic_algorithm(model, world, reports, 2, 2).run(seed=1, checkpoint_path=checkpoint, checkpoint_every=1)
+    resumed = genetic_algorithm(model, world, reports, 2, 4)
+    resumed.run(seed=1, resume_from=checkpoint)
+
+    reader = ReportReader(reports)
+    assert reader.num_series == 1
+    assert len(reader['max']) == 4
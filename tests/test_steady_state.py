@@ -0,0 +1,20 @@
+import pytest
+
+from kheppy.evocom.de import DiffEvolution
+from kheppy.evocom.pso import PartSwarmOpt
+from kheppy.utils.fitfunc import avoid_collision
+
+
+def test_steady_state_reports_evaluator_counters(model, world):
+    algorithm = DiffEvolution().eval_params(model, avoid_collision, num_cycles=40, num_positions=2,
+                                            max_cycle_fitness=1)
+    algorithm.sim_params(world, robot_id=1).main_params(pop_size=10, max_epochs=4)
+    algorithm.run_steady_state(seed=3, report_every=10)
+    assert len(algorithm.reporter.entries['max'][-1]) == 4
+    assert algorithm.reporter.entries['bounded'][-1][-1] > 0
+
+
+def test_steady_state_requires_support(model, world):
+    algorithm = PartSwarmOpt().eval_params(model, avoid_collision).sim_params(world, robot_id=1)
+    with pytest.raises(TypeError):
+        algorithm.run_steady_state()
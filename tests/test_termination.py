@@ -0,0 +1,21 @@
+from kheppy.evocom.de import DiffEvolution
+from kheppy.utils.fitfunc import avoid_collision
+
+
+def diff_evolution(model, world, **kwargs):
+    algorithm = DiffEvolution().eval_params(model, avoid_collision, num_cycles=40, num_positions=2, **kwargs)
+    return algorithm.sim_params(world, robot_id=1).main_params(pop_size=10, max_epochs=4)
+
+
+def test_de_reports_bounded_candidates(model, world):
+    algorithm = diff_evolution(model, world, max_cycle_fitness=1)
+    algorithm.run(seed=3)
+    bounded = algorithm.reporter.entries['bounded'][-1]
+    assert bounded[-1] > 0
+    assert bounded == sorted(bounded)
+
+
+def test_de_without_bound_reports_no_bounded(model, world):
+    algorithm = diff_evolution(model, world)
+    algorithm.run(seed=3)
+    assert set(algorithm.reporter.entries['bounded'][-1]) == {0}